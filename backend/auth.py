@@ -1,5 +1,6 @@
 # backend/auth.py (FINAL - With Calendar Scope)
 import os
+import time
 from datetime import datetime, timedelta, timezone
 from typing import cast
 from dotenv import load_dotenv
@@ -10,7 +11,9 @@ from jose import JWTError, jwt
 from sqlmodel import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from models import User
-from database import get_session
+from database import AsyncSessionLocal
+from services import google_clients
+from services.ttl_cache import TTLCache
 
 load_dotenv()
 
@@ -38,6 +41,17 @@ safe_jwt_secret: str = cast(str, JWT_SECRET)
 ALGORITHM = "HS256"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Hot-path caches: the dashboard fires several authenticated calls back-to-back on load.
+_user_cache = TTLCache(maxsize=int(os.getenv("USER_CACHE_SIZE", "1024")), ttl=float(os.getenv("USER_CACHE_TTL", "60")))
+_jwt_cache = TTLCache(maxsize=int(os.getenv("JWT_CACHE_SIZE", "4096")), ttl=float(os.getenv("JWT_CACHE_TTL", "300")))
+
+def invalidate_user(user_id: int | None):
+    """Drops a cached User row after it changes (tokens, persona)."""
+    _user_cache.pop(user_id)
+
+def auth_cache_stats() -> dict:
+    return {"users": _user_cache.stats(), "jwts": _jwt_cache.stats()}
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(days=3)
@@ -70,22 +84,38 @@ async def find_or_create_user(session: AsyncSession, user_info: dict, token: dic
     session.add(db_user)
     await session.commit()
     await session.refresh(db_user)
+    google_clients.invalidate_user(db_user.id)
+    invalidate_user(db_user.id)
     return db_user
 
-async def get_current_user(token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_session)) -> User:
+def _decode_user_id(token: str) -> int | None:
+    user_id = _jwt_cache.get(token)
+    if user_id is not None: return user_id
+    try:
+        payload = jwt.decode(token, safe_jwt_secret, algorithms=[ALGORITHM])
+        user_id_str = payload.get("sub")
+        if user_id_str is None: return None
+        user_id = int(user_id_str)
+    except (JWTError, ValueError):
+        return None
+    # Never let a cached decode outlive the token's own expiry.
+    remaining = payload.get("exp", 0) - time.time()
+    if remaining > 0: _jwt_cache.set(token, user_id, ttl=min(_jwt_cache.ttl, remaining))
+    return user_id
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, safe_jwt_secret, algorithms=[ALGORITHM])
-        user_id_str = payload.get("sub")
-        if user_id_str is None: raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = await session.get(User, int(user_id_str))
-    if user is None: raise credentials_exception
-    return user
+    user_id = _decode_user_id(token)
+    if user_id is None: raise credentials_exception
 
-#
\ No newline at end of file
+    user = _user_cache.get(user_id)
+    if user is None:
+        # Only a cache miss opens a DB session.
+        async with AsyncSessionLocal() as session:
+            user = await session.get(User, user_id)
+        if user is None: raise credentials_exception
+        _user_cache.set(user_id, user)
+    return user
@@ -0,0 +1,122 @@
+# backend/benchmarks/bench_date_parser.py (Local date parser vs the Gemini date prompt on a fixed corpus)
+# Usage: python benchmarks/bench_date_parser.py [--rounds 200] [--llm]
+#   --llm also sends every corpus entry through the create-event prompt (needs a real GOOGLE_AI_API_KEY).
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime, timezone
+import _bootstrap  # noqa: F401
+from services import date_parser
+
+# Thursday 2025-10-09 10:00 UTC. Expected start times in UTC; None means "ambiguous, defer to the LLM".
+NOW = datetime(2025, 10, 9, 10, 0, tzinfo=timezone.utc)
+CORPUS = [
+    ("tomorrow", "2025-10-10T09:00:00Z"),
+    ("tomorrow at 3:30 pm", "2025-10-10T15:30:00Z"),
+    ("tomorrow morning", "2025-10-10T09:00:00Z"),
+    ("tomorrow afternoon", "2025-10-10T14:00:00Z"),
+    ("noon tomorrow", "2025-10-10T12:00:00Z"),
+    ("today 4pm", "2025-10-09T16:00:00Z"),
+    ("3pm", "2025-10-09T15:00:00Z"),
+    ("9am", "2025-10-10T09:00:00Z"),
+    ("the day after tomorrow at 4pm", "2025-10-11T16:00:00Z"),
+    ("Friday 10am", "2025-10-10T10:00:00Z"),
+    ("this friday", "2025-10-10T09:00:00Z"),
+    ("monday", "2025-10-13T09:00:00Z"),
+    ("next monday", "2025-10-13T09:00:00Z"),
+    ("next Tuesday 3pm", "2025-10-14T15:00:00Z"),
+    ("next thursday", "2025-10-16T09:00:00Z"),
+    ("thursday", "2025-10-16T09:00:00Z"),  # today's weekday, but 9am has passed
+    ("thursday 3pm", "2025-10-09T15:00:00Z"),
+    ("Wed 11:15", "2025-10-15T11:15:00Z"),
+    ("in 3 days", "2025-10-12T09:00:00Z"),
+    ("in a week", "2025-10-16T09:00:00Z"),
+    ("in 2 hours", "2025-10-09T12:00:00Z"),
+    ("in 30 minutes", "2025-10-09T10:30:00Z"),
+    ("oct 14 at 2pm", "2025-10-14T14:00:00Z"),
+    ("October 14th, 2025 2:00 PM", "2025-10-14T14:00:00Z"),
+    ("14 October", "2025-10-14T09:00:00Z"),
+    ("Fri, Oct 17 at 4:00 p.m.", "2025-10-17T16:00:00Z"),
+    ("jan 5", "2026-01-05T09:00:00Z"),
+    ("2025-10-14", "2025-10-14T09:00:00Z"),
+    ("2025-10-14 15:00", "2025-10-14T15:00:00Z"),
+    ("2025-10-14T15:00:00+05:30", "2025-10-14T09:30:00Z"),
+    ("10/14", "2025-10-14T09:00:00Z"),
+    ("14/10/2025", "2025-10-14T09:00:00Z"),
+    ("tuesday 3pm ist", "2025-10-14T09:30:00Z"),
+    ("tue 15:00 pst", "2025-10-14T22:00:00Z"),  # Pacific daylight time in October
+    ("tomorrow 15:00+05:30", "2025-10-10T09:30:00Z"),
+    ("2025-10-14 15:00 -0500", "2025-10-14T20:00:00Z"),
+    ("friday 2pm gmt", "2025-10-10T14:00:00Z"),
+    ("tomorrow 3pm utc+5:30", "2025-10-10T09:30:00Z"),
+    ("monday 9am America/New_York", "2025-10-13T13:00:00Z"),
+    ("tomorrow 3-4pm", "2025-10-10T15:00:00Z"),
+    ("tomorrow 11-1pm", "2025-10-10T11:00:00Z"),
+    ("tomorrow 3pm to 4:30pm", "2025-10-10T15:00:00Z"),
+    ("tomorrow 14:00-15:00", "2025-10-10T14:00:00Z"),
+    ("tomorrow 9:00-10:30", "2025-10-10T09:00:00Z"),
+    ("oct 14 13:00-14:30", "2025-10-14T13:00:00Z"),
+    # Deferred: genuinely ambiguous or outside the grammar.
+    ("next friday", None),
+    ("10/07/2025", None),
+    ("at 3", None),
+    ("sometime next week", None),
+    ("after the standup", None),
+    ("tonight", None),
+    ("end of month", None),
+    ("Thu, Oct 17", None),
+    ("this thursday 9am", None),
+]
+
+def check_local() -> int:
+    failures = 0
+    for text, expected in CORPUS:
+        parsed = date_parser.parse_event_time(text, now=NOW, default_tz="UTC")
+        start = parsed[0] if parsed else None
+        if start != expected:
+            failures += 1
+            print(f"MISMATCH {text!r}: expected {expected}, got {start}")
+    handled = sum(1 for _, expected in CORPUS if expected)
+    print(f"local parser: {len(CORPUS) - failures}/{len(CORPUS)} as expected; {handled} handled locally, {len(CORPUS) - handled} deferred to the LLM")
+    return failures
+
+def time_local(rounds: int):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text, _ in CORPUS: date_parser.parse_event_time(text, now=NOW, default_tz="UTC")
+    per_call = (time.perf_counter() - start) / (rounds * len(CORPUS))
+    print(f"local parser: {per_call * 1e6:.1f} us/parse")
+
+async def compare_llm():
+    from services import ai_service
+    if not await ai_service.ensure_model(): print("LLM comparison skipped: the AI model is not initialized."); return
+    agree, latencies = 0, []
+    for text, expected in CORPUS:
+        prompt = ai_service.build_date_prompt(text, "", NOW.date())
+        start = time.perf_counter()
+        try:
+            response = await ai_service.get_model().generate_content_async(prompt)
+            llm_start = json.loads(ai_service.clean_json_response(response.text))["start_iso"]
+        except Exception as e:
+            llm_start = f"error: {type(e).__name__}"
+        latencies.append(time.perf_counter() - start)
+        if expected and llm_start == expected: agree += 1
+        print(f"{text!r:36} local={expected or 'deferred':22} llm={llm_start}")
+    latencies.sort()
+    handled = sum(1 for _, expected in CORPUS if expected)
+    print(f"LLM agreed with the local parser on {agree}/{handled} locally-handled inputs; "
+          f"median {latencies[len(latencies) // 2] * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms per call")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--llm", action="store_true")
+    args = parser.parse_args()
+    failures = check_local()
+    time_local(args.rounds)
+    if args.llm: asyncio.run(compare_llm())
+    raise SystemExit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
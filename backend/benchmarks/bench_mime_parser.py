@@ -0,0 +1,108 @@
+# backend/benchmarks/bench_mime_parser.py (Legacy vs single-pass Gmail payload parsing)
+# Usage: python benchmarks/bench_mime_parser.py [--messages 300] [--rounds 5]
+import argparse
+import base64
+import random
+import time
+import _bootstrap  # noqa: F401
+from bs4 import BeautifulSoup
+from services import mime_parser
+
+def _b64(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+def _headers(i: int) -> list[dict]:
+    filler = [{'name': f'X-Header-{n}', 'value': f'value {n}'} for n in range(25)]
+    return filler + [{'name': 'From', 'value': f'Sender {i} <s{i}@example.com>'}, {'name': 'Subject', 'value': f'Subject {i}'},
+                     {'name': 'Date', 'value': 'Mon, 6 Oct 2025 09:00:00 +0000'}]
+
+def synthetic_payload(i: int, rng: random.Random) -> dict:
+    paragraphs = [" ".join(rng.choice(["quarterly", "report", "meeting", "deadline", "invoice", "thanks", "team"]) for _ in range(40)) for _ in range(rng.randint(5, 40))]
+    plain = "\n\n".join(paragraphs)
+    html = "<html><head><style>p{color:red}</style></head><body>" + "".join(f"<div><p>{p}</p></div>" for p in paragraphs) + "<script>track()</script></body></html>"
+    alternative = {'mimeType': 'multipart/alternative', 'parts': [
+        {'mimeType': 'text/plain', 'body': {'data': _b64(plain)}},
+        {'mimeType': 'text/html', 'body': {'data': _b64(html)}},
+    ]}
+    attachments = [{'mimeType': 'application/pdf', 'filename': '', 'headers': [{'name': 'Content-Disposition', 'value': f'attachment; filename="doc{n}.pdf"'}],
+                    'body': {'attachmentId': f'att-{i}-{n}', 'size': 1000}} for n in range(rng.randint(0, 4))]
+    inline_images = [{'mimeType': 'image/png', 'body': {'data': _b64("x" * 20000)}} for _ in range(rng.randint(0, 3))]
+    return {'mimeType': 'multipart/mixed', 'headers': _headers(i), 'parts': [alternative, *inline_images, *attachments]}
+
+# --- The parsing path as it was before mime_parser ---
+def legacy_all_parts(payload):
+    parts = [payload]; flat_parts = []
+    while parts:
+        part = parts.pop(0)
+        flat_parts.append(part)
+        if 'parts' in part: parts.extend(part['parts'])
+    return flat_parts
+
+def legacy_email_body(parts):
+    body_html, body_plain = None, None
+    def recurse(sub_parts):
+        nonlocal body_html, body_plain
+        for part in sub_parts:
+            if part.get('body', {}).get('data'):
+                mime_type = part.get('mimeType', '')
+                data = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='ignore')
+                if mime_type == 'text/html': body_html = data
+                elif mime_type == 'text/plain': body_plain = data
+            if part.get('parts'): recurse(part['parts'])
+    recurse(parts)
+    return body_html, body_plain
+
+def legacy_single_email(payload):
+    headers = payload.get('headers', [])
+    subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
+    sender = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown Sender')
+    attachments = [p['body']['attachmentId'] for p in legacy_all_parts(payload) if 'attachmentId' in p.get('body', {})]
+    body_html, body_plain = legacy_email_body(payload['parts'])
+    return subject, sender, body_html or body_plain, attachments
+
+def legacy_thread_text(payload):
+    body_html, body_plain = legacy_email_body([payload])
+    return BeautifulSoup(body_html, 'lxml').get_text(separator='\n', strip=True) if body_html else body_plain
+
+def new_single_email(payload):
+    parsed = mime_parser.ParsedMessage(payload)
+    return parsed.header('subject', 'No Subject'), parsed.header('from', 'Unknown Sender'), parsed.display_body(), [a['id'] for a in parsed.attachments]
+
+def new_html_text(payload):
+    html = mime_parser.ParsedMessage(payload).html_body()
+    return mime_parser.html_to_text(html) if html else ""
+
+def legacy_html_text(payload):
+    body_html, _ = legacy_email_body([payload])
+    return BeautifulSoup(body_html, 'lxml').get_text(separator='\n', strip=True) if body_html else ""
+
+def bench(label: str, fn, corpus: list[dict], rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for payload in corpus: fn(payload)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<34} {best * 1e6 / len(corpus):10.1f} us/message")
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    rng = random.Random(42)
+    corpus = [synthetic_payload(i, rng) for i in range(args.messages)]
+
+    for payload in corpus[:20]:
+        assert legacy_html_text(payload) == new_html_text(payload), "html_to_text output differs from BeautifulSoup"
+        assert legacy_single_email(payload)[:3] == new_single_email(payload)[:3], "single-email fields differ"
+
+    for name, legacy, new in (("single email (headers/body/attachments)", legacy_single_email, new_single_email),
+                              ("HTML body to text", legacy_html_text, new_html_text)):
+        print(f"-- {name}")
+        before = bench("legacy", legacy, corpus, args.rounds)
+        after = bench("mime_parser", new, corpus, args.rounds)
+        print(f"speedup: {before / after:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+# backend/benchmarks/bench_reply_models.py (Per-request overhead of building vs pooling instructed models)
+# Usage: python benchmarks/bench_reply_models.py [--requests 2000] [--personas 20]
+import argparse
+import random
+import time
+import _bootstrap  # noqa: F401
+import google.generativeai as genai
+from services import ai_service
+
+def run(label: str, fn, prompts: list[tuple[str, str]]):
+    start = time.perf_counter()
+    for prompt, persona in prompts: fn(prompt, persona)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1e6 / len(prompts):10.1f} us/request  ({len(prompts)} requests)")
+    return elapsed
+
+def build_fresh(prompt: str, persona: str):
+    mode = ai_service.reply_mode(prompt)
+    return genai.GenerativeModel(ai_service.MODEL_NAME, system_instruction=ai_service.build_reply_instruction(mode, persona))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--personas", type=int, default=20)
+    args = parser.parse_args()
+    personas = [f"Persona #{i}: concise, warm and direct." for i in range(args.personas)]
+    prompts = [(random.choice(["Reply to: lunch on Friday?", "Write a different version of this draft"]), random.choice(personas)) for _ in range(args.requests)]
+
+    before = run("fresh GenerativeModel", build_fresh, prompts)
+    after = run("pooled get_reply_model", ai_service.get_reply_model, prompts)
+    print(f"speedup: {before / after:.1f}x   pool: {ai_service.reply_model_stats()}")
+
+if __name__ == "__main__":
+    main()
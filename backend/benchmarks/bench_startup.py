@@ -0,0 +1,67 @@
+# backend/benchmarks/bench_startup.py (Import time and memory of a fresh web worker)
+# Usage: python benchmarks/bench_startup.py [--runs 5] [--top 15] [--max-seconds 2.5] [--max-rss-mb 150]
+# Exits non-zero when a heavy dependency is imported eagerly again or a budget is exceeded.
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Only needed once an attachment or an AI call arrives; importing `main` must not load them.
+LAZY_MODULES = ("google.generativeai", "pypdf", "pdf2image", "pytesseract", "PIL", "docx", "openpyxl", "pandas", "bs4")
+
+PROBE = """
+import json, resource, sys, time
+sys.path.insert(0, "benchmarks")
+import _bootstrap
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+def probe(extra_args: tuple[str, ...] = ()) -> tuple[dict, str]:
+    result = subprocess.run([sys.executable, *extra_args, "-c", PROBE], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+def slowest_imports(top: int) -> list[tuple[float, str]]:
+    _, stderr = probe(("-X", "importtime"))
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line: continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        if cumulative.strip().isdigit() and depth == 1:  # what `main` imports directly
+            rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-seconds", type=float)
+    parser.add_argument("--max-rss-mb", type=float)
+    args = parser.parse_args()
+
+    samples = [probe()[0] for _ in range(args.runs)]
+    seconds = statistics.median(s["seconds"] for s in samples)
+    rss_mb = statistics.median(s["rss_mb"] for s in samples)
+    loaded = sorted({m for s in samples for m in s["loaded"]})
+    print(f"import main: median {seconds:.2f}s over {args.runs} runs, peak RSS {rss_mb:.0f} MB")
+    print("\nslowest direct imports:")
+    for cumulative, name in slowest_imports(args.top): print(f"  {cumulative:6.3f}s  {name}")
+
+    failed = False
+    if loaded:
+        failed = True; print(f"\nFAIL: imported eagerly: {', '.join(loaded)}")
+    if args.max_seconds and seconds > args.max_seconds:
+        failed = True; print(f"FAIL: import took {seconds:.2f}s (budget {args.max_seconds}s)")
+    if args.max_rss_mb and rss_mb > args.max_rss_mb:
+        failed = True; print(f"FAIL: peak RSS {rss_mb:.0f} MB (budget {args.max_rss_mb} MB)")
+    raise SystemExit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
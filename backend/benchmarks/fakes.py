@@ -0,0 +1,163 @@
+# backend/benchmarks/fakes.py (In-process stand-ins for Gmail, Calendar and Gemini)
+import io
+import json
+import re
+import time
+import random
+import base64
+import asyncio
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode()
+
+def _sleep(latency: float):
+    # Blocking on purpose: real googleapiclient calls block a Google I/O pool thread too.
+    if latency: time.sleep(latency * random.uniform(0.8, 1.2))
+
+class FakeRequest:
+    def __init__(self, latency: float, result):
+        self._latency, self._result = latency, result
+
+    def result(self):
+        return self._result() if callable(self._result) else self._result
+
+    def execute(self, http=None, num_retries=0):
+        _sleep(self._latency)
+        return self.result()
+
+class FakeBatch:
+    """One round-trip for the whole batch, like Gmail's multipart batch endpoint."""
+    def __init__(self, latency: float, callback):
+        self._latency, self._callback, self._requests = latency, callback, []
+
+    def add(self, request: FakeRequest, callback=None, request_id=None):
+        self._requests.append((request_id or str(len(self._requests)), request))
+
+    def execute(self, http=None):
+        _sleep(self._latency)
+        for request_id, request in self._requests: self._callback(request_id, request.result(), None)
+
+class FakeMailbox:
+    """Synthetic mailbox: `inbox_size` multipart messages, threads of `thread_messages`, `body_kb` bodies."""
+    def __init__(self, inbox_size: int = 200, thread_messages: int = 8, body_kb: int = 8, pdf_bytes: bytes = b""):
+        self.inbox_size, self.thread_messages, self.pdf_bytes = inbox_size, thread_messages, pdf_bytes
+        sentence = "Following up on the quarterly report; can we meet Tuesday at 3pm to finalize the budget? "
+        self.body = (sentence * (body_kb * 1024 // len(sentence) + 1))[:body_kb * 1024]
+
+    def message(self, message_id: str, thread_id: str | None = None, sender: str = "Alice <alice@example.com>") -> dict:
+        digits = re.match(r"m?(\d*)", message_id).group(1)  # type: ignore[union-attr]
+        index = int(digits) if digits else 0
+        plain, html = f"{self.body}\n[{message_id}]", f"<html><body><p>{self.body}</p><p>[{message_id}]</p></body></html>"
+        parts = [{'mimeType': 'multipart/alternative', 'parts': [
+            {'mimeType': 'text/plain', 'body': {'data': _b64(plain.encode())}},
+            {'mimeType': 'text/html', 'body': {'data': _b64(html.encode())}},
+        ]}]
+        if self.pdf_bytes:
+            parts.append({'mimeType': 'application/pdf', 'filename': 'scan.pdf', 'body': {'attachmentId': f'att-{message_id}', 'size': len(self.pdf_bytes)}})
+        headers = [{'name': 'From', 'value': sender}, {'name': 'Subject', 'value': f'Subject {message_id}'},
+                   {'name': 'Date', 'value': 'Mon, 6 Oct 2025 09:00:00 +0000'}]
+        return {'id': message_id, 'threadId': thread_id or f"t{index}", 'snippet': self.body[:120], 'labelIds': ['INBOX'],
+                'internalDate': str(1_760_000_000_000 - index * 60_000), 'payload': {'mimeType': 'multipart/mixed', 'headers': headers, 'parts': parts}}
+
+    def thread(self, thread_id: str) -> dict:
+        senders = ["Alice <alice@example.com>", "Bob <bob@example.com>", "Carol <carol@example.com>"]
+        return {'id': thread_id, 'messages': [self.message(f"m{thread_id.lstrip('t')}-{n}", thread_id, senders[n % 3]) for n in range(self.thread_messages)]}
+
+    def page(self, max_results: int, page_token: str | None) -> dict:
+        start = int(page_token or 0)
+        ids = range(start, min(start + max_results, self.inbox_size))
+        result: dict = {'messages': [{'id': f"m{i}", 'threadId': f"t{i}"} for i in ids]}
+        if start + max_results < self.inbox_size: result['nextPageToken'] = str(start + max_results)
+        return result
+
+class _Messages:
+    def __init__(self, service: "FakeGmailService"): self._s = service
+    def list(self, userId, maxResults=100, q=None, pageToken=None):
+        return FakeRequest(self._s.latency, lambda: self._s.mailbox.page(maxResults, pageToken))
+    def get(self, userId, id, format='full', metadataHeaders=None):
+        return FakeRequest(self._s.latency, lambda: self._s.mailbox.message(id))
+    def send(self, userId, body):
+        return FakeRequest(self._s.latency, {'id': 'sent-1', 'labelIds': ['SENT']})
+    def attachments(self):
+        return _Attachments(self._s)
+
+class _Attachments:
+    def __init__(self, service: "FakeGmailService"): self._s = service
+    def get(self, userId, messageId, id):
+        return FakeRequest(self._s.latency, lambda: {'data': _b64(self._s.mailbox.pdf_bytes)})
+
+class _Threads:
+    def __init__(self, service: "FakeGmailService"): self._s = service
+    def get(self, userId, id, format='full'):
+        return FakeRequest(self._s.latency, lambda: self._s.mailbox.thread(id))
+
+class _History:
+    def __init__(self, service: "FakeGmailService"): self._s = service
+    def list(self, userId, startHistoryId, **kwargs):
+        return FakeRequest(self._s.latency, {'historyId': startHistoryId})
+
+class _Users:
+    def __init__(self, service: "FakeGmailService"): self._s = service
+    def messages(self): return _Messages(self._s)
+    def threads(self): return _Threads(self._s)
+    def history(self): return _History(self._s)
+    def getProfile(self, userId): return FakeRequest(self._s.latency, {'historyId': '1000', 'emailAddress': 'bench@example.com'})
+
+class FakeGmailService:
+    def __init__(self, mailbox: FakeMailbox, latency: float):
+        self.mailbox, self.latency = mailbox, latency
+    def users(self): return _Users(self)
+    def new_batch_http_request(self, callback): return FakeBatch(self.latency, callback)
+
+class _Events:
+    def __init__(self, latency: float): self._latency = latency
+    def insert(self, calendarId, body):
+        return FakeRequest(self._latency, {'id': 'evt-1', 'htmlLink': 'https://calendar.example.com/evt-1'})
+
+class FakeCalendarService:
+    def __init__(self, latency: float): self._latency = latency
+    def events(self): return _Events(self._latency)
+
+class _Chunk:
+    def __init__(self, text: str): self.text = text
+
+class _Stream:
+    def __init__(self, text: str, latency: float, chunks: int = 8):
+        step = max(len(text) // chunks, 1)
+        self._pieces, self._delay = [text[i:i + step] for i in range(0, len(text), step)], latency / chunks
+    def __aiter__(self): return self._iterate()
+    async def _iterate(self):
+        for piece in self._pieces:
+            await asyncio.sleep(self._delay)
+            yield _Chunk(piece)
+
+class FakeModel:
+    """Answers like Gemini would for each prompt type this backend sends, after `latency` seconds."""
+    def __init__(self, latency: float): self.latency = latency
+
+    def _answer(self, prompt: str) -> str:
+        if '"start_iso"' in prompt:
+            return json.dumps({"start_iso": "2025-10-07T15:00:00Z", "end_iso": "2025-10-07T16:00:00Z"})
+        if "JSON" in prompt:
+            return json.dumps({"summary": "The team agreed to meet Tuesday to finalize the budget.", "action_items": ["Send the final report"],
+                               "key_dates": ["Tuesday 3pm"], "participants": ["Alice", "Bob", "Carol"]})
+        return "Hi Alice,\n\nTuesday at 3pm works for me. See you then.\n\nBest,\nBench"
+
+    async def generate_content_async(self, prompt, stream: bool = False):
+        answer = self._answer(prompt if isinstance(prompt, str) else str(prompt))
+        if stream: return _Stream(answer, self.latency)
+        await asyncio.sleep(self.latency * random.uniform(0.8, 1.2))
+        return _Chunk(answer)
+
+def scanned_pdf(pages: int) -> bytes:
+    """An image-only PDF (no text layer), so extraction goes through OCR like a real scan."""
+    if pages <= 0: return b""
+    from PIL import Image, ImageDraw
+    images = []
+    for n in range(pages):
+        image = Image.new("L", (1240, 1754), 255)
+        ImageDraw.Draw(image).multiline_text((100, 100), f"Invoice page {n + 1}\nTotal due: $1,234.56\nDue date: October 31", fill=0, spacing=40)
+        images.append(image)
+    buffer = io.BytesIO()
+    images[0].save(buffer, format="PDF", save_all=True, append_images=images[1:], resolution=150)
+    return buffer.getvalue()
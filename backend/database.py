@@ -1,22 +1,100 @@
 # backend/database.py (FINAL - Clean Slate)
 import os
+import time
+import threading
 from dotenv import load_dotenv
 from sqlmodel import SQLModel
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from services import telemetry
 
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL is not set in .env file")
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+# Size these per uvicorn worker: Postgres sees workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections at most.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+_pool_lock = threading.Lock()
+_pool_stats = {"checkouts": 0, "timeouts": 0, "total_checkout_ms": 0.0, "max_checkout_ms": 0.0}
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each connection checkout waits."""
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with _pool_lock: _pool_stats["timeouts"] += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with _pool_lock:
+                _pool_stats["checkouts"] += 1
+                _pool_stats["total_checkout_ms"] += elapsed_ms
+                _pool_stats["max_checkout_ms"] = max(_pool_stats["max_checkout_ms"], elapsed_ms)
+
+engine = create_async_engine(
+    DATABASE_URL, echo=False, poolclass=InstrumentedPool,
+    pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=DB_POOL_PRE_PING,
+)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    telemetry.record("db", time.perf_counter() - conn.info["query_started"].pop())
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _query_failed(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started: telemetry.record("db", time.perf_counter() - started.pop(), error=True)
+
 async def create_db_and_tables():
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
 
+class LazySession:
+    """Stands in for an AsyncSession and only creates one when an endpoint first touches it."""
+    def __init__(self):
+        self._session: AsyncSession | None = None
+
+    def __getattr__(self, name):
+        if self._session is None: self._session = AsyncSessionLocal()
+        return getattr(self._session, name)
+
+    async def close(self):
+        if self._session is not None: await self._session.close()
+
 async def get_session():
-    async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+    session = LazySession()
+    try:
+        yield session
+    finally:
+        await session.close()
+
+def pool_stats() -> dict:
+    pool = engine.pool
+    with _pool_lock:
+        stats = dict(_pool_stats)
+    checkouts, total_ms = stats["checkouts"], stats.pop("total_checkout_ms")
+    checked_out = pool.checkedout()  # type: ignore[attr-defined]
+    stats.update({
+        "pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "checked_out": checked_out,
+        "overflow": pool.overflow(),  # type: ignore[attr-defined]
+        "saturation": round(checked_out / max(DB_POOL_SIZE + DB_MAX_OVERFLOW, 1), 3),
+        "avg_checkout_ms": round(total_ms / checkouts, 2) if checkouts else 0.0,
+        "max_checkout_ms": round(stats["max_checkout_ms"], 2),
+    })
+    return stats
@@ -1,33 +1,44 @@
 # backend/main.py (FINAL - Definitive with Thread Feature)
-import os, json
+import os, json, asyncio
 from datetime import datetime
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI, Depends, Request, HTTPException
-from fastapi.responses import RedirectResponse
+from fastapi import FastAPI, Depends, Request, HTTPException, Query
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse, PlainTextResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
-from bs4 import BeautifulSoup
+from pydantic import BaseModel, EmailStr, Field
+from googleapiclient.errors import HttpError
 
-from database import create_db_and_tables, get_session
+from database import create_db_and_tables, get_session, pool_stats
 from models import User
-from auth import oauth, create_access_token, find_or_create_user, get_current_user
-from services import gmail_service, ai_service, calendar_service
+from auth import oauth, create_access_token, find_or_create_user, get_current_user, invalidate_user, auth_cache_stats
+from services.token_manager import get_google_user
+from services import gmail_service, ai_service, calendar_service, token_manager, google_io, google_clients, attachment_extractor, attachment_cache, llm_cache, sync_service, job_queue, mime_parser, telemetry, date_parser, search_index
 
 load_dotenv()
 CLIENT_URL = os.getenv("CLIENT_URL")
 SESSION_SECRET_KEY = os.getenv("JWT_SECRET")
 if not CLIENT_URL or not SESSION_SECRET_KEY:
     raise ValueError("CLIENT_URL and JWT_SECRET must be set in .env file!")
+INBOX_MAX_PAGE_SIZE = int(os.getenv("INBOX_MAX_PAGE_SIZE", "100"))
+BATCH_SUMMARY_MAX_THREADS = int(os.getenv("BATCH_SUMMARY_MAX_THREADS", "50"))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("INFO:     Starting up and creating database tables...")
     await create_db_and_tables()
+    print(f"INFO:     Purged {await llm_cache.purge_expired()} expired LLM cache entries.")
+    await job_queue.start()
+    # Load the Gemini SDK off the event loop once serving has started, so the first AI request does not pay for it.
+    warmup = asyncio.get_running_loop().run_in_executor(None, ai_service.get_model)
     print("INFO:     Startup complete.")
     yield
+    await warmup
+    await job_queue.stop()
+    google_io.shutdown()
+    attachment_extractor.shutdown()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -36,14 +47,31 @@ app.add_middleware(
     allow_methods=["*"], allow_headers=["*"],
 )
 app.add_middleware(SessionMiddleware, secret_key=SESSION_SECRET_KEY)
+app.add_middleware(telemetry.TracingMiddleware)
+
+@app.exception_handler(asyncio.TimeoutError)
+async def upstream_timeout_handler(request: Request, exc: asyncio.TimeoutError):
+    return JSONResponse(status_code=504, content={"detail": "Upstream Google API call timed out."})
 
 # --- Pydantic Models ---
-class AttachmentInfo(BaseModel): id: str; filename: str; mimeType: str
+class AttachmentInfo(BaseModel): id: str; filename: str; mimeType: str; partId: str | None = None
 class EmailSchema(BaseModel): to: EmailStr; subject: str; body: str
 class SummarizeRequest(BaseModel): text: str
 class GenerateReplyRequest(BaseModel): prompt: str
 class CalendarEventRequest(BaseModel): title: str; date_string: str; context: str
 class PersonaUpdateRequest(BaseModel): persona: str
+class BatchThreadSummaryRequest(BaseModel): thread_ids: list[str] = []; top_n: int | None = Field(default=None, ge=1, le=BATCH_SUMMARY_MAX_THREADS)
+
+# --- Server-Sent Events ---
+def sse_response(events) -> StreamingResponse:
+    """Wraps an async iterator of (event, text) pairs as a text/event-stream response."""
+    async def encode():
+        async for event, text in events:
+            yield f"event: {event}\ndata: {json.dumps({'text': text})}\n\n"
+    return StreamingResponse(encode(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def single_event(event: str, text: str):
+    yield event, text
 
 # --- API Routes ---
 @app.get("/auth/google")
@@ -70,31 +98,66 @@ async def get_profile(current_user: User = Depends(get_current_user)):
     return current_user
 
 @app.get("/api/gmail/inbox")
-async def get_inbox(current_user: User = Depends(get_current_user)):
+async def get_inbox(
+    page_size: int = Query(20, ge=1, le=INBOX_MAX_PAGE_SIZE), page_token: str | None = None,
+    current_user: User = Depends(get_google_user), session: AsyncSession = Depends(get_session),
+):
     service = gmail_service.get_gmail_service(current_user)
-    emails = await gmail_service.fetch_emails(service)
-    return {"emails": emails}
+    assert current_user.id is not None
+    if page_token and not sync_service.is_local_cursor(page_token):
+        # Past the synced window: page through Gmail directly.
+        try:
+            emails, next_page_token = await gmail_service.fetch_email_page(service, max_results=page_size, page_token=page_token)
+        except HttpError as error:
+            # Gmail rejects expired or malformed page tokens; the client should start over from the first page.
+            if error.resp.status not in (400, 404): raise
+            raise HTTPException(status_code=400, detail="Invalid or expired page token; reload the inbox.")
+    else:
+        if not page_token: await sync_service.sync_inbox(service, session, current_user.id)
+        try:
+            emails, next_page_token = await sync_service.inbox_page(session, current_user.id, page_size, cursor=page_token)
+        except ValueError: raise HTTPException(status_code=400, detail="Invalid page token.")
+    return {"emails": emails, "nextPageToken": next_page_token}
+
+@app.get("/api/gmail/search")
+async def search_mail(
+    q: str = Query(..., min_length=1, max_length=256), page_size: int = Query(20, ge=1, le=search_index.SEARCH_MAX_PAGE_SIZE),
+    page_token: str | None = None, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_session),
+):
+    # Served entirely from the local index; no Gmail call and no OAuth token needed.
+    assert current_user.id is not None
+    try: offset = int(page_token or 0)
+    except ValueError: raise HTTPException(status_code=400, detail="Invalid page token.")
+    if offset < 0: raise HTTPException(status_code=400, detail="Invalid page token.")
+    with telemetry.span("search") as span:
+        results, next_offset = await search_index.search(session, current_user.id, q, page_size, offset)
+        span["results"] = len(results)
+    return {"results": results, "nextPageToken": str(next_offset) if next_offset is not None else None}
 
 @app.get("/api/gmail/email/{message_id}")
-async def get_email_content(message_id: str, current_user: User = Depends(get_current_user)):
+async def get_email_content(message_id: str, current_user: User = Depends(get_google_user)):
     service = gmail_service.get_gmail_service(current_user)
-    email_content = await gmail_service.fetch_single_email(service, message_id)
+    email_content = await gmail_service.fetch_single_email(service, message_id, user_id=current_user.id)
     return email_content
 
-@app.post("/api/gmail/email/{message_id}/summarize-attachment")
-async def summarize_attachment_api(message_id: str, attachment: AttachmentInfo, current_user: User = Depends(get_current_user)):
+async def summarize_attachment(current_user: User, message_id: str, attachment: AttachmentInfo) -> dict:
     service = gmail_service.get_gmail_service(current_user)
     text = await gmail_service.get_attachment_text(
         service, message_id=message_id, attachment_id=attachment.id,
-        filename=attachment.filename, mime_type=attachment.mimeType
+        filename=attachment.filename, mime_type=attachment.mimeType, user_id=current_user.id, part_id=attachment.partId
     )
-    if "error" in text.lower() or "could not" in text.lower():
+    # Extraction failures come back as text with a known prefix; a document that mentions "error" is still a document.
+    if text.startswith(attachment_extractor.FAILURE_PREFIXES):
         return {"summary": text}
-    summary = await ai_service.summarize_text(text)
+    summary = await ai_service.summarize_text(text, user_id=current_user.id)
     return {"summary": summary}
 
+@app.post("/api/gmail/email/{message_id}/summarize-attachment")
+async def summarize_attachment_api(message_id: str, attachment: AttachmentInfo, current_user: User = Depends(get_google_user)):
+    return await summarize_attachment(current_user, message_id, attachment)
+
 @app.post("/api/gmail/send")
-async def send_new_email(email_data: EmailSchema, current_user: User = Depends(get_current_user)):
+async def send_new_email(email_data: EmailSchema, current_user: User = Depends(get_google_user)):
     service = gmail_service.get_gmail_service(current_user)
     sent_email = await gmail_service.send_email(service, to=email_data.to, subject=email_data.subject, body=email_data.body)
     return {"message": "Email sent successfully!", "details": sent_email}
@@ -103,28 +166,46 @@ async def send_new_email(email_data: EmailSchema, current_user: User = Depends(g
 async def api_summarize_text(request: SummarizeRequest, current_user: User = Depends(get_current_user)):
     if not request.text or not request.text.strip():
         return {"summary": "Error: Cannot summarize an empty email."}
-    soup = BeautifulSoup(request.text, 'lxml')
-    clean_text = soup.get_text(separator='\n', strip=True)
+    clean_text = mime_parser.html_to_text(request.text)
     if not clean_text:
         return {"summary": "Error: This email contains no readable text to summarize."}
-    summary = await ai_service.summarize_text(clean_text)
+    summary = await ai_service.summarize_text(clean_text, user_id=current_user.id)
     return {"summary": summary}
 
+@app.post("/api/ai/summarize/stream")
+async def api_summarize_text_stream(request: SummarizeRequest, current_user: User = Depends(get_current_user)):
+    clean_text = mime_parser.html_to_text(request.text)
+    if not clean_text:
+        return sse_response(single_event("error", json.dumps({"error": "This email contains no readable text to summarize."})))
+    return sse_response(ai_service.stream_summary(clean_text, user_id=current_user.id))
+
 @app.post("/api/ai/generate-reply")
 async def api_generate_reply(request: GenerateReplyRequest, current_user: User = Depends(get_current_user)):
     reply = await ai_service.generate_reply(request.prompt, persona=current_user.persona or "")
     return {"reply": reply}
 
-@app.post("/api/calendar/create-event")
-async def create_event_api(event_request: CalendarEventRequest, current_user: User = Depends(get_current_user)):
-    if not ai_service.model: raise HTTPException(status_code=503, detail="AI Service not initialized.")
-    prompt = f'Given current date {datetime.utcnow().strftime("%Y-%m-%d")}, parse "{event_request.date_string}" into a valid ISO 8601 UTC string (ending in Z) for a one-hour event. Assume 9 AM if no time. Context: "{event_request.context}". Respond ONLY with raw JSON: {{"start_iso": "...", "end_iso": "..."}}'
+@app.post("/api/ai/generate-reply/stream")
+async def api_generate_reply_stream(request: GenerateReplyRequest, current_user: User = Depends(get_current_user)):
+    return sse_response(ai_service.stream_reply(request.prompt, persona=current_user.persona or ""))
+
+async def parse_date_with_ai(event_request: CalendarEventRequest) -> tuple[str, str]:
+    if not await ai_service.ensure_model(): raise HTTPException(status_code=503, detail="AI Service not initialized.")
+    prompt = ai_service.build_date_prompt(event_request.date_string, event_request.context, datetime.utcnow().date())
     try:
-        response = await ai_service.model.generate_content_async(prompt)
+        with telemetry.span("llm", operation="date_parse") as span:
+            response = await ai_service.get_model().generate_content_async(prompt)
+            ai_service.record_usage(span, response, prompt, response.text)
         parsed_times = json.loads(response.text.replace("```json", "").replace("```", "").strip())
-        start_time, end_time = parsed_times['start_iso'], parsed_times['end_iso']
+        return parsed_times['start_iso'], parsed_times['end_iso']
     except Exception as e:
         print(f"ERROR parsing date with AI: {e}"); raise HTTPException(status_code=500, detail="AI failed to parse date.")
+
+async def create_event(current_user: User, event_request: CalendarEventRequest) -> dict:
+    # Common phrasings are parsed locally; only ambiguous or unusual ones cost a model round-trip.
+    with telemetry.span("date_parse") as span:
+        parsed_times = date_parser.parse_event_time(event_request.date_string)
+        span["local_hits"] = int(parsed_times is not None)
+    start_time, end_time = parsed_times or await parse_date_with_ai(event_request)
     service = calendar_service.get_calendar_service(current_user)
     result = await calendar_service.create_calendar_event(
         service, title=event_request.title, start_time=start_time, end_time=end_time,
@@ -132,6 +213,10 @@ async def create_event_api(event_request: CalendarEventRequest, current_user: Us
     )
     if result["status"] == "error": raise HTTPException(status_code=500, detail=result["message"])
     return result
+
+@app.post("/api/calendar/create-event")
+async def create_event_api(event_request: CalendarEventRequest, current_user: User = Depends(get_google_user)):
+    return await create_event(current_user, event_request)
     
 @app.get("/api/me/persona")
 async def get_persona(current_user: User = Depends(get_current_user)):
@@ -141,23 +226,127 @@ async def get_persona(current_user: User = Depends(get_current_user)):
 async def update_persona(request: PersonaUpdateRequest, current_user: User = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
     user_to_update = await session.get(User, current_user.id)
     if not user_to_update: raise HTTPException(status_code=404, detail="User not found")
+    previous_persona = user_to_update.persona
     user_to_update.persona = request.persona
     session.add(user_to_update)
     await session.commit()
     await session.refresh(user_to_update)
+    invalidate_user(user_to_update.id)
+    if previous_persona != request.persona: ai_service.invalidate_persona(previous_persona)
     return {"message": "Persona updated successfully"}
 
 # --- THIS IS THE NEW ENDPOINT ---
-@app.post("/api/gmail/thread/{thread_id}/summarize")
-async def summarize_thread_api(thread_id: str, current_user: User = Depends(get_current_user)):
+async def summarize_thread(current_user: User, thread_id: str) -> dict:
     service = gmail_service.get_gmail_service(current_user)
-    thread_text = await gmail_service.fetch_thread(service, thread_id)
+    assert current_user.id is not None
+    thread_text, savings = await gmail_service.fetch_thread(service, thread_id, user_id=current_user.id)
     if "Error" in thread_text:
         return {"summary": json.dumps({"summary": thread_text, "action_items": [], "key_dates": []})}
     
     # Pass `is_thread=True` to use the special thread prompt
-    summary_json = await ai_service.summarize_text(thread_text, is_thread=True)
-    return {"summary": summary_json}
+    summary_json = await ai_service.summarize_text(thread_text, is_thread=True, user_id=current_user.id)
+    await search_index.index_summary(current_user.id, thread_id, summary_json)
+    return {"summary": summary_json, "preprocessing": savings}
+
+@app.post("/api/gmail/thread/{thread_id}/summarize")
+async def summarize_thread_api(thread_id: str, current_user: User = Depends(get_google_user)):
+    return await summarize_thread(current_user, thread_id)
+
+async def index_streamed_summary(user_id: int, thread_id: str, events):
+    """Passes SSE events through and indexes the briefing once the stream completes."""
+    async for event, data in events:
+        yield event, data
+        if event == "done": await search_index.index_summary(user_id, thread_id, data)
+
+@app.post("/api/gmail/thread/{thread_id}/summarize/stream")
+async def summarize_thread_stream_api(thread_id: str, current_user: User = Depends(get_google_user)):
+    service = gmail_service.get_gmail_service(current_user)
+    assert current_user.id is not None
+    thread_text, _ = await gmail_service.fetch_thread(service, thread_id, user_id=current_user.id)
+    if "Error" in thread_text:
+        return sse_response(single_event("error", json.dumps({"summary": thread_text, "action_items": [], "key_dates": []})))
+    return sse_response(index_streamed_summary(current_user.id, thread_id, ai_service.stream_summary(thread_text, is_thread=True, user_id=current_user.id)))
+
+@app.post("/api/gmail/threads/summarize")
+async def summarize_threads_api(request: BatchThreadSummaryRequest, current_user: User = Depends(get_google_user), session: AsyncSession = Depends(get_session)):
+    service = gmail_service.get_gmail_service(current_user)
+    assert current_user.id is not None
+    thread_ids = list(dict.fromkeys(request.thread_ids))
+    if request.top_n:
+        await sync_service.sync_inbox(service, session, current_user.id)
+        emails, _ = await sync_service.inbox_page(session, current_user.id, min(request.top_n, INBOX_MAX_PAGE_SIZE))
+        thread_ids = list(dict.fromkeys(thread_ids + [email['threadId'] for email in emails]))
+    if not thread_ids: raise HTTPException(status_code=400, detail="Provide thread_ids or top_n.")
+    if len(thread_ids) > BATCH_SUMMARY_MAX_THREADS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_SUMMARY_MAX_THREADS} threads per request.")
+    threads = await gmail_service.fetch_threads(service, thread_ids, user_id=current_user.id)
+    failed = {thread_id: text for thread_id, (text, _) in threads.items() if text.startswith("Error")}
+    to_summarize = {thread_id: text for thread_id, (text, _) in threads.items() if thread_id not in failed}
+
+    async def results():
+        for thread_id, text in failed.items():
+            yield "result", json.dumps({"threadId": thread_id, "summary": json.dumps({"summary": text, "action_items": [], "key_dates": []})})
+        async for thread_id, summary_json in ai_service.summarize_many(to_summarize, is_thread=True, user_id=current_user.id):
+            await search_index.index_summary(current_user.id, thread_id, summary_json)
+            yield "result", json.dumps({"threadId": thread_id, "summary": summary_json, "preprocessing": threads[thread_id][1]})
+        yield "done", json.dumps({"count": len(threads)})
+    return sse_response(results())
+
+# --- Background Jobs ---
+@app.post("/api/jobs/attachment-summary/{message_id}", status_code=202)
+async def submit_attachment_summary_job(message_id: str, attachment: AttachmentInfo, current_user: User = Depends(get_google_user)):
+    assert current_user.id is not None
+    job = await job_queue.submit(current_user.id, "attachment-summary", f"{message_id}:{attachment.partId or attachment.id}",
+                                 lambda: summarize_attachment(current_user, message_id, attachment))
+    return job_queue.job_view(job)
+
+@app.post("/api/jobs/thread-summary/{thread_id}", status_code=202)
+async def submit_thread_summary_job(thread_id: str, current_user: User = Depends(get_google_user)):
+    assert current_user.id is not None
+    job = await job_queue.submit(current_user.id, "thread-summary", thread_id, lambda: summarize_thread(current_user, thread_id))
+    return job_queue.job_view(job)
+
+@app.post("/api/jobs/calendar-event", status_code=202)
+async def submit_calendar_event_job(event_request: CalendarEventRequest, current_user: User = Depends(get_google_user)):
+    assert current_user.id is not None
+    dedupe_key = json.dumps(event_request.model_dump(), sort_keys=True)
+    job = await job_queue.submit(current_user.id, "calendar-event", dedupe_key, lambda: create_event(current_user, event_request))
+    return job_queue.job_view(job)
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str, current_user: User = Depends(get_current_user)):
+    assert current_user.id is not None
+    job = await job_queue.get_job(job_id, current_user.id)
+    if job is None: raise HTTPException(status_code=404, detail="Job not found")
+    return job_queue.job_view(job)
+
+def service_stats() -> dict:
+    return {
+        "google_io": google_io.stats(),
+        "google_clients": google_clients.stats(),
+        "attachment_cache": attachment_cache.stats(),
+        "llm_cache": llm_cache.stats(),
+        "reply_models": ai_service.reply_model_stats(),
+        "inbox_sync": sync_service.stats(),
+        "search_index": search_index.stats(),
+        "auth": auth_cache_stats(),
+        "db_pool": pool_stats(),
+        "oauth_tokens": token_manager.stats(),
+        "jobs": job_queue.stats(),
+        "singleflight": {
+            "emails": gmail_service.email_flights.stats(),
+            "threads": gmail_service.thread_flights.stats(),
+            "summaries": ai_service.summary_flights.stats(),
+        },
+    }
+
+@app.get("/api/metrics")
+async def get_metrics():
+    return {**service_stats(), "stages": telemetry.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(telemetry.render_prometheus(service_stats()), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def read_root():
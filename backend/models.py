@@ -1,6 +1,8 @@
 # backend/models.py (FINAL - With Persona Field)
 from typing import Optional
 from sqlmodel import Field, SQLModel
+from sqlalchemy import BigInteger, Column, Computed, Index, Text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from datetime import datetime
 
 class User(SQLModel, table=True):
@@ -12,4 +14,64 @@ class User(SQLModel, table=True):
     oauth_access_token: Optional[str] = Field(default=None, max_length=2048)
     oauth_refresh_token: Optional[str] = Field(default=None, max_length=2048)
     oauth_token_expiry: Optional[datetime] = Field(default=None)
-    persona: Optional[str] = Field(default="A professional and helpful assistant.", max_length=1024)
\ No newline at end of file
+    persona: Optional[str] = Field(default="A professional and helpful assistant.", max_length=1024)
+
+class LLMResponseCache(SQLModel, table=True):
+    key: str = Field(primary_key=True, max_length=64)
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    response: str
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class MailboxSyncState(SQLModel, table=True):
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    history_id: Optional[str] = Field(default=None, max_length=64)
+    # Gmail pageToken for the first message after the synced window.
+    next_page_token: Optional[str] = Field(default=None, max_length=256)
+    synced_at: Optional[datetime] = Field(default=None)
+
+
+class MessageMetadata(SQLModel, table=True):
+    __table_args__ = (Index("ix_messagemetadata_user_date", "user_id", "internalDate"),)
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    id: str = Field(primary_key=True, max_length=64)
+    threadId: str = Field(index=True, max_length=64)
+    subject: str = Field(default="No Subject")
+    sender: str = Field(default="Unknown Sender")
+    snippet: str = Field(default="")
+    internalDate: int = Field(default=0, sa_type=BigInteger)
+
+
+class BackgroundJob(SQLModel, table=True):
+    id: str = Field(primary_key=True, max_length=32)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    kind: str = Field(max_length=64)
+    status: str = Field(default="queued", max_length=16)
+    result: Optional[str] = Field(default=None)
+    error: Optional[str] = Field(default=None, max_length=2048)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = Field(default=None)
+
+
+class SearchDocument(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_searchdocument_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_searchdocument_user_thread", "user_id", "threadId"),
+    )
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    message_id: str = Field(primary_key=True, max_length=64)
+    threadId: str = Field(max_length=64)
+    subject: str = Field(default="")
+    sender: str = Field(default="")
+    snippet: str = Field(default="")
+    # The message's own text (quoted history, signature and footers removed); empty until the message is opened.
+    body: str = Field(default="", sa_type=Text)
+    # Thread summary, action items and key dates, once a summary has been generated.
+    summary: str = Field(default="", sa_type=Text)
+    internalDate: int = Field(default=0, sa_type=BigInteger)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # Maintained by Postgres; the config here must match search_index.TEXT_SEARCH_CONFIG.
+    search_vector: Optional[str] = Field(default=None, sa_column=Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('english', subject), 'A') || setweight(to_tsvector('english', sender), 'A')"
+        " || setweight(to_tsvector('english', summary), 'B') || setweight(to_tsvector('english', snippet || ' ' || body), 'C')",
+        persisted=True)))
@@ -1,25 +1,95 @@
 # backend/services/ai_service.py (FINAL - Definitive with Executive Briefing)
 import os
+import re
 import json
-import google.generativeai as genai
+import asyncio
+import hashlib
+import threading
+from datetime import date
+from services import llm_cache, telemetry
+from services.ttl_cache import TTLCache
+from services.singleflight import SingleFlight
 
+MODEL_NAME = 'gemini-2.0-flash'
+# Bump whenever the summary prompts change so cached responses from older prompts are ignored.
+SUMMARY_PROMPT_VERSION = "1"
+# Inputs above this estimate are summarized map-reduce style, one chunk per prompt.
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "12000"))
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+CHARS_PER_TOKEN = 4
+MAX_HEADER_CHARS = 500
+_MESSAGE_BOUNDARY = re.compile(r"(?m)^(?=--- Email from )")
+
+# Fan-out limits for batch summarization (e.g. the morning triage view).
+BATCH_SUMMARY_CONCURRENCY = int(os.getenv("BATCH_SUMMARY_CONCURRENCY", "4"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "120"))
+
+class RateLimiter:
+    """Spaces calls at least 60/per_minute seconds apart; 0 disables limiting."""
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval: return
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0: await asyncio.sleep(wait)
+
+_batch_rate_limiter = RateLimiter(LLM_REQUESTS_PER_MINUTE)
+# Concurrent identical summaries (same user, prompt version, model and input) share one Gemini call.
+summary_flights = SingleFlight()
+
+# Instructed models are immutable once built, so one per (mode, persona) is shared by all requests.
+_reply_models = TTLCache(
+    maxsize=int(os.getenv("REPLY_MODEL_POOL_SIZE", "128")),
+    ttl=float(os.getenv("REPLY_MODEL_POOL_TTL", "3600")),
+)
+
+# Built on first use: importing and configuring the Gemini SDK costs every worker seconds at startup.
+# Assigning `model` directly (e.g. a stand-in for load tests) skips the lazy setup.
 model = None
-try:
-    api_key = os.getenv("GOOGLE_AI_API_KEY")
-    if not api_key: raise ValueError("GOOGLE_AI_API_KEY is not set!")
-    genai.configure(api_key=api_key) # type: ignore
-    model = genai.GenerativeModel('gemini-2.0-flash') # type: ignore
-    print("INFO: Google AI Model 'gemini-2.0-flash' initialized successfully.")
-except Exception as e:
-    print(f"--- FATAL GOOGLE AI ERROR ---\n{repr(e)}\n---")
-
-async def summarize_text(text_to_summarize: str, is_thread: bool = False) -> str:
-    if not model: return json.dumps({"error": "The AI model is not initialized."})
-    if not text_to_summarize.strip(): return json.dumps({"error": "No text was provided to summarize."})
+_model_setup_attempted = False
+_model_lock = threading.Lock()
+
+def _genai():
+    import google.generativeai as genai
+    return genai
 
+def get_model():
+    global model, _model_setup_attempted
+    if model is not None or _model_setup_attempted: return model
+    with _model_lock:  # The startup warm-up thread and a first request may race here.
+        if model is None and not _model_setup_attempted:
+            try:
+                api_key = os.getenv("GOOGLE_AI_API_KEY")
+                if not api_key: raise ValueError("GOOGLE_AI_API_KEY is not set!")
+                genai = _genai()
+                genai.configure(api_key=api_key) # type: ignore
+                model = genai.GenerativeModel(MODEL_NAME) # type: ignore
+                print(f"INFO: Google AI Model '{MODEL_NAME}' initialized successfully.")
+            except Exception as e:
+                print(f"--- FATAL GOOGLE AI ERROR ---\n{repr(e)}\n---")
+            finally:
+                _model_setup_attempted = True
+    return model
+
+async def ensure_model():
+    """get_model for coroutines: a first setup, or waiting on the warm-up thread holding the lock, runs off the event loop."""
+    if model is not None or _model_setup_attempted: return model
+    return await asyncio.to_thread(get_model)
+
+def summary_cache_key(text_to_summarize: str, is_thread: bool) -> str:
+    mode = "thread" if is_thread else "email"
+    return llm_cache.make_key(SUMMARY_PROMPT_VERSION, MODEL_NAME, mode, llm_cache.normalize_text(text_to_summarize))
+
+def build_summary_prompt(text_to_summarize: str, is_thread: bool) -> str:
     # This is the new logic to handle both single emails and threads
     if is_thread:
-        prompt = f"""
+        return f"""
         You are an expert executive assistant. Analyze the following email thread and provide a concise "Executive Briefing".
         Your response MUST be ONLY a single, raw JSON object. Do not include markdown.
         
@@ -40,7 +110,7 @@ async def summarize_text(text_to_summarize: str, is_thread: bool = False) -> str
         ---END THREAD---
         """
     else:
-        prompt = f"""
+        return f"""
         Analyze the following email content and extract key information.
         Your response must be ONLY a single, raw JSON object.
         The JSON object must have this exact structure:
@@ -50,36 +120,266 @@ async def summarize_text(text_to_summarize: str, is_thread: bool = False) -> str
         {text_to_summarize}
         ---END EMAIL CONTENT---
         """
+
+def clean_json_response(raw: str) -> str:
+    return raw.replace("```json", "").replace("```", "").strip()
+
+def build_reduce_prompt(partial_summaries: str, is_thread: bool) -> str:
+    participants = ',\n            "participants": ["Everyone named in any part, without duplicates."]' if is_thread else ""
+    return f"""
+        You are an expert executive assistant. The {"email thread" if is_thread else "document"} below was too long to read at once,
+        so each consecutive part was summarized separately, in order. Merge the partial summaries into one briefing.
+        Your response MUST be ONLY a single, raw JSON object. Do not include markdown.
+
+        The JSON object must have this exact structure:
+        {{
+            "summary": "One coherent narrative covering every part from start to finish.",
+            "action_items": ["All unresolved action items, deduplicated."],
+            "key_dates": ["All upcoming dates or deadlines, deduplicated."]{participants}
+        }}
+
+        ---PARTIAL SUMMARIES IN ORDER---
+        {partial_summaries}
+        ---END PARTIAL SUMMARIES---
+        """
+
+SUMMARY_ERROR_JSON = json.dumps({"summary": "Error: Could not generate a summary.", "action_items": [], "key_dates": [], "participants": [], "error": "true"})
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def needs_map_reduce(text: str) -> bool:
+    """Same character limit split_for_summary packs chunks to, so a chunk never needs splitting again."""
+    return len(text) > SUMMARY_CHUNK_TOKENS * CHARS_PER_TOKEN
+
+def _split_oversized(unit: str, max_chars: int, separators: tuple[str, ...]) -> list[str]:
+    if len(unit) <= max_chars: return [unit]
+    if not separators: return [unit[i:i + max_chars] for i in range(0, len(unit), max_chars)]
+    pieces = []
+    for piece in unit.split(separators[0]):
+        if piece.strip(): pieces.extend(_split_oversized(piece, max_chars, separators[1:]))
+    return pieces
+
+def _pack(units: list[str], max_chars: int) -> list[str]:
+    chunks, current = [], ""
+    for unit in units:
+        if current and len(current) + len(unit) + 1 > max_chars:
+            chunks.append(current); current = unit
+        else:
+            current = f"{current}\n{unit}" if current else unit
+    if current: chunks.append(current)
+    return chunks
+
+def split_for_summary(text: str, max_tokens: int = SUMMARY_CHUNK_TOKENS) -> list[str]:
+    """Splits on message boundaries first, then PDF page breaks, paragraphs and lines, and packs the pieces into chunks."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    units = []
+    for message in _MESSAGE_BOUNDARY.split(text):
+        message = message.strip()
+        if not message: continue
+        if len(message) <= max_chars or not message.startswith("--- Email from "):
+            units.extend(_split_oversized(message, max_chars, ("\f", "\n\n", "\n"))); continue
+        # Keep the sender/date header on every piece of an oversized message.
+        header, _, body = message.partition("\n")
+        header = header[:min(MAX_HEADER_CHARS, max_chars // 2)]  # a runaway header must not crowd out the body
+        body_chars = max_chars - len(header) - 1
+        units.extend(f"{header}\n{piece}" for piece in _pack(_split_oversized(body, body_chars, ("\n\n", "\n")), body_chars))
+    return _pack(units, max_chars)
+
+def record_usage(span: dict, response, prompt: str, text: str):
+    """Token counts from Gemini's usage metadata, estimated when a response does not carry any."""
+    usage = getattr(response, "usage_metadata", None)
+    span["prompt_tokens"] = getattr(usage, "prompt_token_count", 0) or estimate_tokens(prompt)
+    span["output_tokens"] = getattr(usage, "candidates_token_count", 0) or estimate_tokens(text)
+
+async def _generate_json(prompt: str, user_id: int | None, cache_key: str) -> str | None:
     try:
-        response = await model.generate_content_async(prompt)
-        raw_text = response.text.replace("```json", "").replace("```", "").strip()
-        json.loads(raw_text) # Validate it's proper JSON
+        with telemetry.span("llm", operation="summary") as span:
+            response = await get_model().generate_content_async(prompt)
+            record_usage(span, response, prompt, response.text)
+        raw_text = clean_json_response(response.text)
+        if not isinstance(json.loads(raw_text), dict): raise ValueError("Expected a JSON object")
+        await llm_cache.put(user_id, cache_key, raw_text)
         return raw_text
     except Exception as e:
         print(f"--- RAW GOOGLE AI ERROR during summarization ---\n{repr(e)}\n--- END RAW ERROR ---")
-        return json.dumps({"summary": "Error: Could not generate a summary.", "action_items": [], "key_dates": [], "participants": [], "error": "true"})
+        return None
 
-async def generate_reply(prompt: str, persona: str) -> str:
-    if not model: return "Error: The AI model is not initialized."
-    if not prompt.strip(): return "Error: No prompt provided."
+def _pack_partials(partials: list[str], max_tokens: int) -> list[list[str]]:
+    groups, current, current_tokens = [], [], 0
+    for partial in partials:
+        tokens = estimate_tokens(partial)
+        if current and current_tokens + tokens > max_tokens:
+            groups.append(current); current, current_tokens = [], 0
+        current.append(partial); current_tokens += tokens
+    if current: groups.append(current)
+    return groups
 
-    if "different version" in prompt:
-        system_instruction = f"""You are an expert email assistant rewriting a draft.
+async def _reduce_summaries(partials: list[str], is_thread: bool, user_id: int | None) -> str | None:
+    if len(partials) <= 1: return partials[0] if partials else None
+    groups = _pack_partials(partials, SUMMARY_CHUNK_TOKENS)
+    if 1 < len(groups) < len(partials):
+        # Too many partials for one prompt: reduce each group, then reduce the results.
+        reduced = await asyncio.gather(*(_reduce_summaries(group, is_thread, user_id) for group in groups))
+        return await _reduce_summaries([r for r in reduced if r], is_thread, user_id)
+    combined = "\n".join(f"--- PART {i} ---\n{partial}" for i, partial in enumerate(partials, 1))
+    mode = "reduce-thread" if is_thread else "reduce-email"
+    cache_key = llm_cache.make_key(SUMMARY_PROMPT_VERSION, MODEL_NAME, mode, llm_cache.normalize_text(combined))
+    cached = await llm_cache.get(user_id, cache_key)
+    if cached is not None: return cached
+    return await _generate_json(build_reduce_prompt(combined, is_thread), user_id, cache_key)
+
+def _is_usable_partial(partial: str | None) -> bool:
+    try:
+        parsed = json.loads(partial) if partial else None
+    except ValueError:
+        return False
+    return isinstance(parsed, dict) and not parsed.get("error")
+
+async def _map_reduce_summary(text_to_summarize: str, is_thread: bool, user_id: int | None) -> str | None:
+    chunks = split_for_summary(text_to_summarize)
+    semaphore = asyncio.Semaphore(SUMMARY_MAP_CONCURRENCY)
+    async def summarize_chunk(chunk: str) -> str | None:
+        # Straight to the model, never back through summarize_text: per-chunk results are still cached on their own.
+        cache_key = summary_cache_key(chunk, is_thread)
+        cached = await llm_cache.get(user_id, cache_key)
+        if cached is not None: return cached
+        async with semaphore: return await _generate_json(build_summary_prompt(chunk, is_thread), user_id, cache_key)
+    partials = await asyncio.gather(*(summarize_chunk(chunk) for chunk in chunks))
+    usable = [p for p in partials if _is_usable_partial(p)]
+    print(f"INFO: Map-reduce summary over {len(chunks)} chunks ({len(usable)} succeeded).")
+    return await _reduce_summaries(usable, is_thread, user_id)
+
+async def summarize_text(text_to_summarize: str, is_thread: bool = False, user_id: int | None = None) -> str:
+    if not await ensure_model(): return json.dumps({"error": "The AI model is not initialized."})
+    if not text_to_summarize.strip(): return json.dumps({"error": "No text was provided to summarize."})
+
+    cache_key = summary_cache_key(text_to_summarize, is_thread)
+    return await summary_flights.do((user_id, cache_key), lambda: _summarize_uncoalesced(text_to_summarize, is_thread, user_id, cache_key))
+
+async def _summarize_uncoalesced(text_to_summarize: str, is_thread: bool, user_id: int | None, cache_key: str) -> str:
+    cached = await llm_cache.get(user_id, cache_key)
+    if cached is not None: return cached
+
+    if needs_map_reduce(text_to_summarize):
+        result = await _map_reduce_summary(text_to_summarize, is_thread, user_id)
+        if result: await llm_cache.put(user_id, cache_key, result)
+    else:
+        result = await _generate_json(build_summary_prompt(text_to_summarize, is_thread), user_id, cache_key)
+    return result or SUMMARY_ERROR_JSON
+
+async def summarize_many(texts: dict[str, str], is_thread: bool = False, user_id: int | None = None):
+    """Summarizes several inputs concurrently and yields (key, summary_json) pairs as each one completes."""
+    semaphore = asyncio.Semaphore(BATCH_SUMMARY_CONCURRENCY)
+    async def summarize_one(key: str, text: str) -> tuple[str, str]:
+        async with semaphore:
+            await _batch_rate_limiter.acquire()
+            return key, await summarize_text(text, is_thread=is_thread, user_id=user_id)
+    for finished in asyncio.as_completed([summarize_one(key, text) for key, text in texts.items()]):
+        yield await finished
+
+async def stream_summary(text_to_summarize: str, is_thread: bool = False, user_id: int | None = None):
+    """Yields ("chunk", text) pieces as Gemini produces them, then one ("done", json) or ("error", json).
+
+    The briefing JSON is only parseable once complete, so it is validated (and cached) at the end.
+    """
+    if not await ensure_model(): yield "error", json.dumps({"error": "The AI model is not initialized."}); return
+    if not text_to_summarize.strip(): yield "error", json.dumps({"error": "No text was provided to summarize."}); return
+
+    cache_key = summary_cache_key(text_to_summarize, is_thread)
+    cached = await llm_cache.get(user_id, cache_key)
+    if cached is not None: yield "done", cached; return
+    if needs_map_reduce(text_to_summarize):
+        # Partial chunk summaries are not meaningful to stream; send the merged briefing when ready.
+        result = await summarize_text(text_to_summarize, is_thread=is_thread, user_id=user_id)
+        yield ("error" if result == SUMMARY_ERROR_JSON else "done"), result; return
+
+    parts = []
+    try:
+        prompt = build_summary_prompt(text_to_summarize, is_thread)
+        with telemetry.span("llm", operation="summary_stream") as span:
+            response = await get_model().generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                parts.append(chunk.text)
+                yield "chunk", chunk.text
+            record_usage(span, response, prompt, "".join(parts))
+        raw_text = clean_json_response("".join(parts))
+        json.loads(raw_text) # Validate the assembled stream is proper JSON
+    except Exception as e:
+        print(f"--- RAW GOOGLE AI ERROR during streamed summarization ---\n{repr(e)}\n--- END RAW ERROR ---")
+        yield "error", SUMMARY_ERROR_JSON; return
+    await llm_cache.put(user_id, cache_key, raw_text)
+    yield "done", raw_text
+
+def build_date_prompt(date_string: str, context: str, today: date) -> str:
+    return f'Given current date {today.strftime("%Y-%m-%d")}, parse "{date_string}" into a valid ISO 8601 UTC string (ending in Z) for a one-hour event. Assume 9 AM if no time. Context: "{context}". Respond ONLY with raw JSON: {{"start_iso": "...", "end_iso": "..."}}'
+
+def reply_mode(prompt: str) -> str:
+    return "rewrite" if "different version" in prompt else "draft"
+
+def build_reply_instruction(mode: str, persona: str) -> str:
+    if mode == "rewrite":
+        return f"""You are an expert email assistant rewriting a draft.
         Your task is to re-write the email based on the original context, but with a different tone or structure.
         You MUST adopt the following persona for your writing style: "{persona}"
         Generate only the full, complete body of the new email draft. DO NOT add any commentary.
         """
     else:
-        system_instruction = f"""You are an expert email assistant. Your task is to draft a professional and helpful email reply.
+        return f"""You are an expert email assistant. Your task is to draft a professional and helpful email reply.
         You MUST adopt the following persona for your writing style: "{persona}"
         Generate only the full body of the email. Do not include the 'Subject:' line.
         """
 
-    instructed_model = genai.GenerativeModel('gemini-2.0-flash', system_instruction=system_instruction) # type: ignore
+def _persona_hash(persona: str) -> str:
+    return hashlib.sha256(persona.encode("utf-8")).hexdigest()
+
+def get_reply_model(prompt: str, persona: str):
+    mode = reply_mode(prompt)
+    key = (mode, _persona_hash(persona))
+    instructed_model = _reply_models.get(key)
+    if instructed_model is None:
+        instructed_model = _genai().GenerativeModel(MODEL_NAME, system_instruction=build_reply_instruction(mode, persona)) # type: ignore
+        _reply_models.set(key, instructed_model)
+    return instructed_model
+
+def invalidate_persona(persona: str | None):
+    """Evicts the pooled models built for a persona that is no longer in use."""
+    persona_hash = _persona_hash(persona or "")
+    return _reply_models.pop_where(lambda key: key[1] == persona_hash)
+
+def reply_model_stats() -> dict:
+    return _reply_models.stats()
+
+async def generate_reply(prompt: str, persona: str) -> str:
+    if not await ensure_model(): return "Error: The AI model is not initialized."
+    if not prompt.strip(): return "Error: No prompt provided."
+
+    instructed_model = get_reply_model(prompt, persona)
         
     try:
-        response = await instructed_model.generate_content_async(prompt)
+        with telemetry.span("llm", operation="reply") as span:
+            response = await instructed_model.generate_content_async(prompt)
+            record_usage(span, response, prompt, response.text)
         return response.text
     except Exception as e:
         print(f"--- RAW GOOGLE AI ERROR during reply generation ---\n{repr(e)}\n--- END RAW ERROR ---")
-        return "Error: Could not generate reply. Check logs."
\ No newline at end of file
+        return "Error: Could not generate reply. Check logs."
+
+async def stream_reply(prompt: str, persona: str):
+    """Yields ("chunk", text) pieces of the draft, then ("done", full_draft) or ("error", message)."""
+    if not await ensure_model(): yield "error", "Error: The AI model is not initialized."; return
+    if not prompt.strip(): yield "error", "Error: No prompt provided."; return
+
+    instructed_model = get_reply_model(prompt, persona)
+    parts = []
+    try:
+        with telemetry.span("llm", operation="reply_stream") as span:
+            response = await instructed_model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                parts.append(chunk.text)
+                yield "chunk", chunk.text
+            record_usage(span, response, prompt, "".join(parts))
+    except Exception as e:
+        print(f"--- RAW GOOGLE AI ERROR during streamed reply generation ---\n{repr(e)}\n--- END RAW ERROR ---")
+        yield "error", "Error: Could not generate reply. Check logs."; return
+    yield "done", "".join(parts)
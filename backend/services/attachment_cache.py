@@ -0,0 +1,126 @@
+# backend/services/attachment_cache.py (Content-addressed disk cache for extracted attachment text)
+import os
+import asyncio
+import hashlib
+import tempfile
+import threading
+
+ATTACHMENT_CACHE_DIR = os.getenv("ATTACHMENT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "bharath-ai", "attachment-text"))
+ATTACHMENT_CACHE_MAX_BYTES = int(os.getenv("ATTACHMENT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+_lock = threading.Lock()
+_total_bytes: int | None = None
+_stats = {"hits": 0, "misses": 0, "alias_hits": 0, "writes": 0, "evictions": 0}
+
+def content_key(file_data: bytes, extractor_version: str) -> str:
+    return f"{hashlib.sha256(file_data).hexdigest()}-v{extractor_version}"
+
+def alias_key(user_id: int | None, message_id: str, part_id: str, filename: str, mime_type: str, extractor_version: str) -> str:
+    """Gmail attachment ids are not stable, but a message's attachment bytes never change.
+
+    The MIME part id tells apart two attachments with the same name, and the extractor version is part of
+    the alias too, so a version bump cannot reach old text through it.
+    """
+    return hashlib.sha256(f"{user_id}:{message_id}:{part_id}:{filename}:{mime_type}:v{extractor_version}".encode()).hexdigest()
+
+def _text_path(key: str) -> str:
+    return os.path.join(ATTACHMENT_CACHE_DIR, "text", key[:2], f"{key}.txt")
+
+def _alias_path(key: str) -> str:
+    return os.path.join(ATTACHMENT_CACHE_DIR, "alias", key[:2], key)
+
+def _write_atomic(path: str, data: str) -> int:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "w", encoding="utf-8") as f: f.write(data)
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+def _write_entry(path: str, data: str):
+    """Writes a text or alias file and keeps the running size in step (callers hold _lock)."""
+    global _total_bytes
+    try: previous = os.path.getsize(path)
+    except FileNotFoundError: previous = 0
+    size = _write_atomic(path, data)
+    if _total_bytes is not None: _total_bytes += size - previous
+
+def _iter_files():
+    # Alias files count against the bound and age out like text entries; a dangling alias just misses.
+    for kind in ("text", "alias"):
+        for dirpath, _, filenames in os.walk(os.path.join(ATTACHMENT_CACHE_DIR, kind)):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try: st = os.stat(path)
+                except FileNotFoundError: continue
+                yield path, st.st_size, st.st_mtime
+
+def _evict_if_needed():
+    global _total_bytes
+    if _total_bytes is None:
+        _total_bytes = sum(size for _, size, _ in _iter_files())
+    if _total_bytes <= ATTACHMENT_CACHE_MAX_BYTES: return
+    # Least recently used first: hits bump mtime, so the oldest mtimes go first.
+    for path, size, _ in sorted(_iter_files(), key=lambda item: item[2]):
+        if _total_bytes <= ATTACHMENT_CACHE_MAX_BYTES * 0.9: break
+        try: os.remove(path)
+        except FileNotFoundError: continue
+        _total_bytes -= size; _stats["evictions"] += 1
+
+def _read(key: str) -> str | None:
+    path = _text_path(key)
+    try:
+        with open(path, encoding="utf-8") as f: text = f.read()
+    except FileNotFoundError:
+        return None
+    os.utime(path)
+    return text
+
+def _lookup_alias(alias: str) -> str | None:
+    path = _alias_path(alias)
+    try:
+        with open(path, encoding="utf-8") as f: key = f.read().strip()
+    except FileNotFoundError:
+        return None
+    with _lock:
+        text = _read(key)
+        if text is not None:
+            _stats["alias_hits"] += 1
+            try: os.utime(path)
+            except FileNotFoundError: pass
+    return text
+
+def _lookup(key: str) -> str | None:
+    with _lock:
+        text = _read(key)
+        _stats["hits" if text is not None else "misses"] += 1
+    return text
+
+def _store(key: str, text: str, alias: str | None):
+    with _lock:
+        _write_entry(_text_path(key), text)
+        if alias: _write_entry(_alias_path(alias), key)
+        _stats["writes"] += 1
+        _evict_if_needed()
+
+def _remember_alias(alias: str, key: str):
+    with _lock:
+        _write_entry(_alias_path(alias), key)
+        _evict_if_needed()
+
+async def lookup_alias(alias: str) -> str | None:
+    return await asyncio.to_thread(_lookup_alias, alias)
+
+async def lookup(key: str) -> str | None:
+    return await asyncio.to_thread(_lookup, key)
+
+async def store(key: str, text: str, alias: str | None = None):
+    try: await asyncio.to_thread(_store, key, text, alias)
+    except OSError as e: print(f"ERROR writing attachment cache entry {key}: {e}")
+
+async def remember_alias(alias: str, key: str):
+    try: await asyncio.to_thread(_remember_alias, alias, key)
+    except OSError as e: print(f"ERROR writing attachment cache alias: {e}")
+
+def stats() -> dict:
+    with _lock:
+        return {**_stats, "bytes": _total_bytes, "max_bytes": ATTACHMENT_CACHE_MAX_BYTES}
@@ -0,0 +1,209 @@
+# backend/services/attachment_extractor.py (Pluggable attachment text extraction on a process pool)
+import os
+import asyncio
+import multiprocessing
+import tempfile
+from typing import Awaitable, Callable, NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from services import telemetry
+
+# Parsing libraries (pypdf, pdf2image, pytesseract, python-docx, openpyxl) are imported inside the worker
+# functions, so neither the web workers nor idle pool processes pay for them until an attachment needs them.
+
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+EXTRACT_TIMEOUT = float(os.getenv("EXTRACT_TIMEOUT", "120"))
+OCR_MAX_PAGES = int(os.getenv("OCR_MAX_PAGES", "50"))
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+XLSX_MAX_ROWS = int(os.getenv("XLSX_MAX_ROWS", "5000"))
+MIN_TEXT_LAYER_CHARS = 100
+PAGE_BREAK = "\f"
+# Bump whenever extraction output changes so cached text from older extractors is ignored.
+EXTRACTOR_VERSION = "1"
+TRUNCATION_MARKER = "[OCR incomplete:"
+FAILURE_PREFIXES = ("CRITICAL ERROR", "Could not extract", "A critical error occurred")
+
+_pool: ProcessPoolExecutor | None = None
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Spawned, not forked: the parent runs Google I/O threads that must not be copied mid-call.
+        _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True); _pool = None
+
+# --- Worker-side functions (run in child processes) ---
+def _read_text_layer(pdf_path: str) -> tuple[str, int]:
+    from pypdf import PdfReader
+    reader = PdfReader(pdf_path)
+    return PAGE_BREAK.join(page.extract_text() or "" for page in reader.pages), len(reader.pages)
+
+def _count_pages(pdf_path: str) -> int:
+    from pdf2image import pdfinfo_from_path
+    return int(pdfinfo_from_path(pdf_path).get("Pages", 0))
+
+def _ocr_page(pdf_path: str, page_number: int, dpi: int) -> str:
+    import pytesseract
+    from pdf2image import convert_from_path
+    # Rasterize a single page so only one 300-DPI image per worker is ever held in memory.
+    images = convert_from_path(pdf_path, dpi, first_page=page_number, last_page=page_number)
+    return "".join(pytesseract.image_to_string(image, lang='eng') for image in images)
+
+def _read_docx(docx_path: str) -> str:
+    import docx
+    document = docx.Document(docx_path)
+    lines = [paragraph.text for paragraph in document.paragraphs if paragraph.text.strip()]
+    for table in document.tables:
+        for row in table.rows:
+            cells = [cell.text.strip() for cell in row.cells]
+            if any(cells): lines.append("\t".join(cells))
+    return "\n".join(lines)
+
+def _read_xlsx(xlsx_path: str, max_rows: int) -> str:
+    from openpyxl import load_workbook
+    # read_only streams rows from the zip instead of building every cell object up front.
+    workbook = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        lines = []
+        for sheet in workbook.worksheets:
+            lines.append(f"## Sheet: {sheet.title}")
+            for row_number, row in enumerate(sheet.iter_rows(values_only=True)):
+                if row_number == max_rows:
+                    lines.append(f"[Spreadsheet limited to the first {max_rows} rows of this sheet]"); break
+                cells = ["" if value is None else str(value) for value in row]
+                while cells and not cells[-1]: cells.pop()
+                if cells: lines.append("\t".join(cells))
+        return "\n".join(lines)
+    finally:
+        workbook.close()
+
+def _read_plain_text(path: str) -> str:
+    with open(path, "rb") as f: return f.read().decode("utf-8", errors="ignore")
+
+# --- Registry ---
+class Extractor(NamedTuple):
+    name: str
+    mime_types: tuple[str, ...]
+    extensions: tuple[str, ...]
+    extract: Callable[[str, str, float], Awaitable[str]]  # (temp file path, filename, loop deadline) -> text
+
+_extractors: list[Extractor] = []
+
+def register(name: str, mime_types: tuple[str, ...] = (), extensions: tuple[str, ...] = ()):
+    """Decorator adding an async extractor; registrations made later take precedence."""
+    def decorator(extract):
+        _extractors.insert(0, Extractor(name, mime_types, extensions, extract))
+        return extract
+    return decorator
+
+def find_extractor(mime_type: str, filename: str) -> Extractor | None:
+    mime_type, extension = (mime_type or "").lower(), os.path.splitext(filename or "")[1].lower()
+    return next((e for e in _extractors if mime_type in e.mime_types or extension in e.extensions), None)
+
+def supported_types() -> dict[str, list[str]]:
+    return {e.name: [*e.mime_types, *e.extensions] for e in reversed(_extractors)}
+
+async def run_in_pool(fn, *args, deadline: float):
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(loop.run_in_executor(_get_pool(), fn, *args), timeout=max(deadline - loop.time(), 0))
+
+# --- Event-loop side ---
+def is_cacheable(text: str) -> bool:
+    """Failures and time/page-truncated OCR are not worth remembering."""
+    return bool(text) and not text.startswith(FAILURE_PREFIXES) and TRUNCATION_MARKER not in text
+
+def _page_ranges(pages: list[int]) -> str:
+    """[1, 2, 3, 5] -> "1-3, 5"."""
+    ranges: list[list[int]] = []
+    for page in sorted(pages):
+        if ranges and page == ranges[-1][1] + 1: ranges[-1][1] = page
+        else: ranges.append([page, page])
+    return ", ".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+async def _ocr_pages(loop, pool, pdf_path: str, page_count: int, deadline: float) -> str:
+    pages_to_ocr = min(page_count, OCR_MAX_PAGES)
+    texts: dict[int, str] = {}
+    in_flight: dict[asyncio.Future, int] = {}
+    next_page = 1
+    # At most one page per worker is submitted at a time, so at the deadline nothing is left queued
+    # and only the pages already running finish in the background.
+    while next_page <= pages_to_ocr or in_flight:
+        while next_page <= pages_to_ocr and len(in_flight) < EXTRACT_WORKERS:
+            in_flight[loop.run_in_executor(pool, _ocr_page, pdf_path, next_page, OCR_DPI)] = next_page
+            next_page += 1
+        done, _ = await asyncio.wait(in_flight, timeout=max(deadline - loop.time(), 0), return_when=asyncio.FIRST_COMPLETED)
+        if not done: break
+        for future in done:
+            page = in_flight.pop(future)
+            if not future.exception(): texts[page] = future.result()
+    for future in in_flight: future.cancel()
+    ocr_text = PAGE_BREAK.join(texts.get(n, "") for n in range(1, pages_to_ocr + 1))
+    if len(texts) < page_count and ocr_text.strip():
+        ocr_text += f"\n{TRUNCATION_MARKER} read pages {_page_ranges(list(texts))} of {page_count}]"
+    return ocr_text
+
+@register("pdf", mime_types=("application/pdf", "application/x-pdf"), extensions=(".pdf",))
+async def extract_pdf(pdf_path: str, filename: str, deadline: float) -> str:
+    try:
+        text_content, page_count = await run_in_pool(_read_text_layer, pdf_path, deadline=deadline)
+    except (asyncio.TimeoutError, BrokenProcessPool): raise
+    except Exception: text_content, page_count = "", 0
+    if len(text_content.strip()) < MIN_TEXT_LAYER_CHARS:
+        if not page_count:
+            page_count = await run_in_pool(_count_pages, pdf_path, deadline=deadline)
+        with telemetry.span("ocr", pages=min(page_count, OCR_MAX_PAGES)):
+            ocr_text = await _ocr_pages(asyncio.get_running_loop(), _get_pool(), pdf_path, page_count, deadline)
+        if len(ocr_text.strip()) > len(text_content.strip()): text_content = ocr_text
+    if not text_content.strip(): return "Could not extract readable text from PDF."
+    return text_content.strip()
+
+@register("docx", mime_types=("application/vnd.openxmlformats-officedocument.wordprocessingml.document",), extensions=(".docx",))
+async def extract_docx(docx_path: str, filename: str, deadline: float) -> str:
+    text = await run_in_pool(_read_docx, docx_path, deadline=deadline)
+    return text.strip() or f"Could not extract readable text from '{filename}'."
+
+@register("xlsx", mime_types=("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "application/vnd.ms-excel.sheet.macroenabled.12"),
+          extensions=(".xlsx", ".xlsm"))
+async def extract_xlsx(xlsx_path: str, filename: str, deadline: float) -> str:
+    text = await run_in_pool(_read_xlsx, xlsx_path, XLSX_MAX_ROWS, deadline=deadline)
+    return text.strip() or f"Could not extract readable text from '{filename}'."
+
+@register("text", mime_types=("text/plain", "text/csv", "text/markdown"), extensions=(".txt", ".csv", ".md"))
+async def extract_plain_text(path: str, filename: str, deadline: float) -> str:
+    text = await asyncio.to_thread(_read_plain_text, path)
+    return text.strip() or f"Could not extract readable text from '{filename}'."
+
+async def extract_text_from_attachment(mime_type: str, file_data: bytes, filename: str) -> str:
+    extractor = find_extractor(mime_type, filename)
+    if extractor is None: return f"CRITICAL ERROR: File '{filename}' ({mime_type}) is not a supported attachment type."
+    with telemetry.span(f"{extractor.name}_extract", bytes=len(file_data)) as span:
+        text = await _extract_with(extractor, file_data, filename)
+        span["chars"] = len(text)
+        return text
+
+async def _extract_with(extractor: Extractor, file_data: bytes, filename: str) -> str:
+    deadline = asyncio.get_running_loop().time() + EXTRACT_TIMEOUT
+    suffix = os.path.splitext(filename or "")[1] or f".{extractor.name}"
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        temp_file.write(file_data)
+        temp_path = temp_file.name
+    try:
+        return await extractor.extract(temp_path, filename, deadline)
+    except asyncio.TimeoutError:
+        print(f"ERROR: {extractor.name} extraction for '{filename}' exceeded {EXTRACT_TIMEOUT}s.")
+        return f"Could not extract text from '{filename}' within {int(EXTRACT_TIMEOUT)} seconds."
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM on a huge scan); start a fresh pool for the next job.
+        print(f"CRITICAL ERROR: extraction worker crashed while processing '{filename}'.")
+        shutdown()
+        return f"A critical error occurred while processing the {extractor.name.upper()}: BrokenProcessPool."
+    except Exception as e:
+        print(f"CRITICAL ERROR during {extractor.name} parsing for '{filename}': {e}")
+        return f"A critical error occurred while processing the {extractor.name.upper()}: {type(e).__name__}."
+    finally:
+        if os.path.exists(temp_path): os.remove(temp_path)
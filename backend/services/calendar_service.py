@@ -1,23 +1,13 @@
 # backend/services/calendar_service.py (NEW FILE)
-import os
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from models import User
 from datetime import datetime, timedelta
+from services import google_io, google_clients
 
 def get_calendar_service(user: User):
-    """Builds and returns an authenticated Google Calendar API service object."""
-    creds = Credentials(
-        token=user.oauth_access_token,
-        refresh_token=user.oauth_refresh_token,
-        token_uri='https://oauth2.googleapis.com/token',
-        client_id=os.getenv("GOOGLE_CLIENT_ID"),
-        client_secret=os.getenv("GOOGLE_CLIENT_SECRET")
-    )
+    """Returns a cached, authenticated Google Calendar API service object."""
     try:
-        service = build('calendar', 'v3', credentials=creds, static_discovery=False)
-        return service
+        return google_clients.get_client(user, 'calendar', 'v3')
     except HttpError as error:
         print(f'An error occurred building the Calendar service: {error}')
         raise
@@ -37,7 +27,7 @@ async def create_calendar_event(service, title: str, start_time: str, end_time:
         },
     }
     try:
-        created_event = service.events().insert(calendarId='primary', body=event).execute()
+        created_event = await google_io.execute(service.events().insert(calendarId='primary', body=event), stage="calendar")
         print(f"Event created: {created_event.get('htmlLink')}")
         return {"status": "success", "link": created_event.get('htmlLink')}
     except HttpError as error:
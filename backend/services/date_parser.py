@@ -0,0 +1,208 @@
+# backend/services/date_parser.py (Rule-based natural-language event time parser)
+import os
+import re
+from datetime import datetime, date, time, timedelta, timezone, tzinfo
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Matches the LLM prompt's conventions: one-hour events, 9 AM when no time is given, UTC unless a zone is named.
+DEFAULT_EVENT_HOUR = 9
+EVENT_DURATION = timedelta(hours=1)
+EVENT_DEFAULT_TIMEZONE = os.getenv("EVENT_DEFAULT_TIMEZONE", "UTC")
+
+WEEKDAYS = {"monday": 0, "mon": 0, "tuesday": 1, "tue": 1, "tues": 1, "wednesday": 2, "wed": 2, "thursday": 3, "thu": 3, "thur": 3, "thurs": 3,
+            "friday": 4, "fri": 4, "saturday": 5, "sat": 5, "sunday": 6, "sun": 6}
+MONTHS = {"january": 1, "jan": 1, "february": 2, "feb": 2, "march": 3, "mar": 3, "april": 4, "apr": 4, "may": 5, "june": 6, "jun": 6,
+          "july": 7, "jul": 7, "august": 8, "aug": 8, "september": 9, "sep": 9, "sept": 9, "october": 10, "oct": 10,
+          "november": 11, "nov": 11, "december": 12, "dec": 12}
+# Abbreviations are ambiguous in general; these are the readings our users mean (IST is India). They map to the
+# region's civil time rather than a fixed offset, because "3pm PST" in October means Pacific time, daylight saving or not.
+ZONE_ABBREVIATIONS = {"utc": "UTC", "gmt": "UTC", "z": "UTC", "ist": "Asia/Kolkata", "jst": "Asia/Tokyo", "sgt": "Asia/Singapore",
+                      "bst": "Europe/London", "cet": "Europe/Paris", "cest": "Europe/Paris", "eet": "Europe/Athens", "eest": "Europe/Athens",
+                      "aest": "Australia/Sydney", "aedt": "Australia/Sydney", "est": "America/New_York", "edt": "America/New_York",
+                      "cst": "America/Chicago", "cdt": "America/Chicago", "mst": "America/Denver", "mdt": "America/Denver",
+                      "pst": "America/Los_Angeles", "pdt": "America/Los_Angeles"}
+PERIODS = {"morning": 9, "afternoon": 14, "evening": 18}
+FILLER = {"on", "at", "the", "of", "by", "from", "for", "@", "around", "in"}
+
+_WEEKDAY = "|".join(sorted(WEEKDAYS, key=len, reverse=True))
+_MONTH = "|".join(sorted(MONTHS, key=len, reverse=True))
+_ZONE = "|".join(sorted(ZONE_ABBREVIATIONS, key=len, reverse=True))
+_CLOCK = r"(\d{1,2})(?::([0-5]\d))?\s*(am|pm)?"
+
+# A bare numeric offset only straight after an HH:MM time. "-HH:MM" there is a 24-hour range ("14:00-15:00"),
+# so a negative offset must be written "-HHMM".
+_RE_OFFSET = re.compile(r"\b(?:utc|gmt)\s*([+-])(\d{1,2})(?::?([0-5]\d))?\b|(?<=\d:[0-5]\d)\s?(\+|-(?=\d{4}\b))(\d{2}):?([0-5]\d)\b")
+_RE_ZONE_NAME = re.compile(r"\b([a-z]+/[a-z_]+(?:/[a-z_]+)?)\b")
+_RE_ZONE_ABBREVIATION = re.compile(rf"\b({_ZONE})\b")
+_RE_RANGE = re.compile(rf"\b{_CLOCK}\s*(?:-|–|to|until|till)\s*{_CLOCK}(?=\s|$)")
+_RE_TIME = re.compile(r"\b(\d{1,2})(?::([0-5]\d))?\s*(am|pm)\b|\b([01]?\d|2[0-3]):([0-5]\d)\b|\b(noon|midday|midnight)\b")
+_RE_AT_HOUR = re.compile(r"\bat\s+(\d{1,2})(?=\s|$)")
+_RE_ISO_DATETIME = re.compile(r"\d{4}-\d{2}-\d{2}[t ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:z|[+-]\d{2}:?\d{2})?")
+_RE_ISO_DATE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_RE_NUMERIC_DATE = re.compile(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{2}|\d{4}))?\b")
+_RE_MONTH_DAY = re.compile(rf"\b({_MONTH})\s+(\d{{1,2}})(?:\s+(\d{{4}}))?\b")
+_RE_DAY_MONTH = re.compile(rf"\b(\d{{1,2}})\s+(?:of\s+)?({_MONTH})(?:\s+(\d{{4}}))?\b")
+_RE_RELATIVE_DAY = re.compile(r"\b(day after tomorrow|today|tomorrow|tmrw|tmr)\b")
+_RE_IN_DAYS = re.compile(r"\bin\s+(\d{1,3}|a|an|one|two|three)\s+(days?|weeks?)\b")
+_RE_IN_HOURS = re.compile(r"\bin\s+(\d{1,3}|a|an|one|two|three|half an)\s+(hours?|minutes?|mins?)\b")
+_RE_WEEKDAY = re.compile(rf"\b(?:(next|this|coming)\s+)?({_WEEKDAY})\b")
+_RE_PERIOD = re.compile(rf"\b(?:in\s+the\s+)?({'|'.join(PERIODS)})\b")
+_WORD_NUMBERS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "half an": 0.5}
+
+class Ambiguous(Exception):
+    """The input is understood but has more than one plausible reading; let the LLM decide."""
+
+def _normalize(text: str) -> str:
+    text = text.lower().replace("a.m.", "am").replace("p.m.", "pm").replace(",", " ").replace("—", " - ")
+    text = re.sub(r"\b(\d{1,2})(st|nd|rd|th)\b", r"\1", text)
+    return re.sub(r"\s+", " ", text).strip(" .")
+
+def _take(pattern: re.Pattern, text: str) -> tuple[re.Match | None, str]:
+    """Finds one match and blanks it out, so leftovers can be checked for words we did not understand."""
+    matches = list(pattern.finditer(text))
+    if not matches: return None, text
+    if len(matches) > 1: raise Ambiguous(f"several matches for {pattern.pattern!r}")
+    match = matches[0]
+    return match, text[:match.start()] + " " + text[match.end():]
+
+def _clock(hour: str, minute: str | None, meridiem: str | None) -> time:
+    h, m = int(hour), int(minute or 0)
+    if meridiem:
+        if not 1 <= h <= 12: raise ValueError("hour out of range for am/pm")
+        h = h % 12 + (12 if meridiem == "pm" else 0)
+    elif not 0 <= h <= 23: raise ValueError("hour out of range")
+    return time(h, m)
+
+def _zone(text: str) -> tuple[tzinfo | None, str]:
+    match, text = _take(_RE_OFFSET, text)
+    if match:
+        sign, hours, minutes = (match.group(1), match.group(2), match.group(3)) if match.group(1) else (match.group(4), match.group(5), match.group(6))
+        offset = timedelta(hours=int(hours), minutes=int(minutes or 0))
+        return timezone(-offset if sign == "-" else offset), text
+    match, text = _take(_RE_ZONE_NAME, text)
+    if match:
+        name = next((n for n in _zone_names() if n.lower() == match.group(1)), None)
+        if name is None: raise Ambiguous(f"unknown time zone {match.group(1)!r}")
+        return ZoneInfo(name), text
+    match, text = _take(_RE_ZONE_ABBREVIATION, text)
+    if match: return ZoneInfo(ZONE_ABBREVIATIONS[match.group(1)]), text
+    return None, text
+
+_zone_name_cache: list[str] = []
+def _zone_names() -> list[str]:
+    if not _zone_name_cache:
+        from zoneinfo import available_timezones
+        _zone_name_cache.extend(available_timezones())
+    return _zone_name_cache
+
+def _times(text: str) -> tuple[time | None, time | None, str]:
+    match, text = _take(_RE_RANGE, text)
+    if match:
+        start_h, start_m, start_mer, end_h, end_m, end_mer = match.groups()
+        if not (start_mer or end_mer or start_m or end_m): raise Ambiguous("time range without am/pm")
+        end = _clock(end_h, end_m, end_mer)
+        start = _clock(start_h, start_m, start_mer or end_mer)
+        if not start_mer and end_mer and start > end:
+            start = _clock(start_h, start_m, "am" if end_mer == "pm" else "pm")  # "11-1pm" starts at 11am
+        return start, end, text
+    match, text = _take(_RE_TIME, text)
+    if match:
+        hour, minute, meridiem, hour24, minute24, word = match.groups()
+        if word: return time(0) if word == "midnight" else time(12), None, text
+        return (_clock(hour, minute, meridiem) if hour else _clock(hour24, minute24, None)), None, text
+    match, text = _take(_RE_AT_HOUR, text)
+    if match:
+        if int(match.group(1)) < 13: raise Ambiguous("bare hour without am/pm")
+        return _clock(match.group(1), None, None), None, text
+    return None, None, text
+
+def _year_for(month: int, day: int, year: str | None, today: date) -> date:
+    if year: return date(int(year) + (2000 if len(year) == 2 else 0), month, day)
+    candidate = date(today.year, month, day)
+    return candidate if candidate >= today else date(today.year + 1, month, day)
+
+def _day(text: str, today: date) -> tuple[date | None, str, str | None]:
+    """(day, rest of text, qualifier) where the qualifier ("" when bare) is set only for a weekday that is today."""
+    found: list[date] = []
+    match, text = _take(_RE_ISO_DATE, text)
+    if match: found.append(date(int(match.group(1)), int(match.group(2)), int(match.group(3))))
+    match, text = _take(_RE_NUMERIC_DATE, text)
+    if match:
+        first, second = int(match.group(1)), int(match.group(2))
+        if first <= 12 and second <= 12 and first != second: raise Ambiguous("numeric date could be month/day or day/month")
+        month, day = (first, second) if first <= 12 else (second, first)
+        found.append(_year_for(month, day, match.group(3), today))
+    for pattern, month_group, day_group in ((_RE_MONTH_DAY, 1, 2), (_RE_DAY_MONTH, 2, 1)):
+        match, text = _take(pattern, text)
+        if match: found.append(_year_for(MONTHS[match.group(month_group)], int(match.group(day_group)), match.group(3), today))
+    match, text = _take(_RE_RELATIVE_DAY, text)
+    if match: found.append(today + timedelta(days={"today": 0, "day after tomorrow": 2}.get(match.group(1), 1)))
+    match, text = _take(_RE_IN_DAYS, text)
+    if match:
+        count = _WORD_NUMBERS.get(match.group(1)) or int(match.group(1))
+        found.append(today + timedelta(days=count * (7 if match.group(2).startswith("week") else 1)))
+    if len(set(found)) > 1: raise Ambiguous("conflicting dates")
+    match, text = _take(_RE_WEEKDAY, text)
+    if match:
+        qualifier, weekday = match.group(1), WEEKDAYS[match.group(2)]
+        if found:
+            # "Fri, Oct 17": the weekday only confirms the date.
+            if found[0].weekday() != weekday or qualifier: raise Ambiguous("weekday does not match the date")
+            return found[0], text, None
+        ahead = (weekday - today.weekday()) % 7
+        if qualifier == "next":
+            # "next Friday" said on a Tuesday could mean this Friday or the one after.
+            if ahead and today.weekday() + ahead < 7: raise Ambiguous("'next <weekday>' within the current week")
+            ahead = ahead or 7
+        found.append(today + timedelta(days=ahead))
+        if not ahead: return found[0], text, qualifier or ""
+    return (found[0] if found else None), text, None
+
+def parse_event_time(text: str, now: datetime | None = None, default_tz: str | None = None) -> tuple[str, str] | None:
+    """(start_iso, end_iso) in UTC for common phrasings like "next Tuesday 3pm IST"; None when the LLM should decide."""
+    now = now or datetime.now(timezone.utc)
+    if not text or not text.strip(): return None
+    try:
+        return _parse(_normalize(text), now, default_tz or EVENT_DEFAULT_TIMEZONE)
+    except (Ambiguous, ValueError, ZoneInfoNotFoundError):
+        return None
+
+def _parse(text: str, now: datetime, default_tz: str) -> tuple[str, str] | None:
+    if _RE_ISO_DATETIME.fullmatch(text):
+        start = datetime.fromisoformat(text.upper())
+        if start.tzinfo is None: start = start.replace(tzinfo=ZoneInfo(default_tz))
+        return _iso(start, start + EVENT_DURATION)
+
+    zone, text = _zone(text)
+    tz = zone or ZoneInfo(default_tz)
+    match, text = _take(_RE_IN_HOURS, text)
+    if match:
+        count = _WORD_NUMBERS.get(match.group(1)) or int(match.group(1))
+        start = now + (timedelta(hours=count) if match.group(2).startswith("hour") else timedelta(minutes=count))
+        if set(text.split()) - FILLER: return None
+        return _iso(start, start + EVENT_DURATION)
+
+    local_now = now.astimezone(tz)
+    # Dates first, so "2025-10-07" is not read as a "10-07" time range.
+    day, text, same_weekday = _day(text, local_now.date())
+    start_time, end_time, text = _times(text)
+    period, text = _take(_RE_PERIOD, text)
+    if set(text.split()) - FILLER: return None  # Words we do not understand: not safe to guess.
+    if day is None and start_time is None: return None
+    if start_time is None: start_time = time(PERIODS[period.group(1)] if period else DEFAULT_EVENT_HOUR)
+    elif period and (period.group(1) == "morning") != (start_time.hour < 12): raise Ambiguous("time contradicts part of day")
+    if day is None:
+        # A bare time means its next occurrence.
+        day = local_now.date() if start_time > local_now.time() else local_now.date() + timedelta(days=1)
+    if same_weekday is not None and datetime.combine(day, start_time, tzinfo=tz) <= local_now:
+        # "Monday 9am" said on Monday afternoon means next week; "this Monday 9am" has already passed.
+        if same_weekday == "this": raise Ambiguous("'this <weekday>' time has already passed")
+        day += timedelta(days=7)
+    start = datetime.combine(day, start_time, tzinfo=tz)
+    end = datetime.combine(day, end_time, tzinfo=tz) if end_time else start + EVENT_DURATION
+    if end <= start: return None
+    return _iso(start, end)
+
+def _iso(start: datetime, end: datetime) -> tuple[str, str]:
+    to_utc = lambda moment: moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return to_utc(start), to_utc(end)
@@ -1,168 +1,171 @@
 # backend/services/gmail_service.py (FINAL - Definitive with Thread Feature)
-import base64, os, io, tempfile
+import base64, asyncio
 from email.mime.text import MIMEText
-import pytesseract
-from PIL import Image
-from pdf2image import convert_from_path
-from pypdf import PdfReader
-import pandas as pd
-import docx
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from models import User
-from bs4 import BeautifulSoup
+from services import google_io, google_clients, attachment_extractor, attachment_cache, mime_parser, telemetry, thread_cleaner, search_index
+from services.singleflight import SingleFlight
+
+# Concurrent identical fetches for the same user (double clicks, dashboard re-fetches) share one Gmail call.
+email_flights, thread_flights = SingleFlight(), SingleFlight()
 
 SCOPES = ['https://www.googleapis.com/auth/gmail.modify', 'https://www.googleapis.com/auth/calendar.events']
 
 def get_gmail_service(user: User):
     if not user.oauth_access_token: raise ValueError("User has not granted Gmail permissions.")
-    creds = Credentials(
-        token=user.oauth_access_token, refresh_token=user.oauth_refresh_token,
-        token_uri='https://oauth2.googleapis.com/token', client_id=os.getenv("GOOGLE_CLIENT_ID"),
-        client_secret=os.getenv("GOOGLE_CLIENT_SECRET"), scopes=SCOPES
-    )
     try:
-        return build('gmail', 'v1', credentials=creds, static_discovery=False)
+        return google_clients.get_client(user, 'gmail', 'v1', scopes=SCOPES)
     except HttpError as error:
         print(f'An error occurred building the Gmail service: {error}'); raise
 
-def extract_text_from_attachment(mime_type: str, file_data: bytes, filename: str) -> str:
-    # (This function is unchanged)
-    is_pdf = "pdf" in mime_type.lower() or (filename and filename.lower().endswith('.pdf'))
-    if not is_pdf: return f"CRITICAL ERROR: File '{filename}' not identified as PDF."
-    text_content = ""
-    try:
-        try:
-            reader = PdfReader(io.BytesIO(file_data))
-            for page in reader.pages: text_content += page.extract_text() or ""
-        except Exception: text_content = ""
-        if len(text_content.strip()) < 100:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
-                temp_pdf.write(file_data)
-                temp_pdf_path = temp_pdf.name
-            try:
-                pages = convert_from_path(temp_pdf_path, 300)
-                ocr_text = ""
-                for page_image in pages: ocr_text += pytesseract.image_to_string(page_image, lang='eng') + "\n"
-                if len(ocr_text.strip()) > len(text_content.strip()): text_content = ocr_text
-            finally:
-                if os.path.exists(temp_pdf_path): os.remove(temp_pdf_path)
-        if not text_content.strip(): return "Could not extract readable text from PDF."
-        return text_content.strip()
-    except Exception as e:
-        print(f"CRITICAL ERROR during PDF parsing for '{filename}': {e}")
-        return f"A critical error occurred while processing the PDF: {type(e).__name__}."
-
-async def get_attachment_text(service, message_id: str, attachment_id: str, filename: str, mime_type: str):
-    # (This function is unchanged)
+async def get_attachment_text(service, message_id: str, attachment_id: str, filename: str, mime_type: str, user_id: int | None = None, part_id: str | None = None):
     try:
-        attachment_meta = service.users().messages().attachments().get(userId='me', messageId=message_id, id=attachment_id).execute()
+        # A message's attachments never change, so a known (message, part) skips the download entirely.
+        # Without a part id, same-named files in one message could collide, so there is no alias.
+        alias = attachment_cache.alias_key(user_id, message_id, part_id, filename, mime_type, attachment_extractor.EXTRACTOR_VERSION) if part_id else None
+        cached = await attachment_cache.lookup_alias(alias) if alias else None
+        if cached is not None: return cached
+        attachment_meta = await google_io.execute(service.users().messages().attachments().get(userId='me', messageId=message_id, id=attachment_id))
         data = attachment_meta.get('data')
         if not data: raise ValueError("Attachment data not found.")
         file_data = base64.urlsafe_b64decode(data.encode('UTF-8'))
-        return extract_text_from_attachment(mime_type, file_data, filename)
+        key = attachment_cache.content_key(file_data, attachment_extractor.EXTRACTOR_VERSION)
+        cached = await attachment_cache.lookup(key)
+        if cached is not None:
+            if alias: await attachment_cache.remember_alias(alias, key)
+            return cached
+        text = await attachment_extractor.extract_text_from_attachment(mime_type, file_data, filename)
+        if attachment_extractor.is_cacheable(text): await attachment_cache.store(key, text, alias=alias)
+        return text
     except Exception as e:
         print(f'CRITICAL ERROR in get_attachment_text: {e}')
         return f"A critical error occurred: {type(e).__name__} - {e}"
 
-def get_all_parts(payload):
-    # (This function is unchanged)
-    parts = [payload]; flat_parts = []
-    while parts:
-        part = parts.pop(0)
-        flat_parts.append(part)
-        if 'parts' in part: parts.extend(part['parts'])
-    return flat_parts
-
-def get_email_body(parts):
-    # (This function is unchanged)
-    body_html, body_plain = None, None
-    def recurse(sub_parts):
-        nonlocal body_html, body_plain
-        for part in sub_parts:
-            if part.get('body', {}).get('data'):
-                mime_type = part.get('mimeType', '')
-                data = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='ignore')
-                if mime_type == 'text/html': body_html = data
-                elif mime_type == 'text/plain': body_plain = data
-            if part.get('parts'): recurse(part['parts'])
-    recurse(parts)
-    return body_html, body_plain
-
-async def fetch_emails(service, max_results=20):
-    # (This function is unchanged)
+# Gmail caps a batch at 100 calls and recommends staying at or below 50.
+GMAIL_BATCH_LIMIT = 50
+
+# Per-message failures inside a batch (rate limits, backend errors) are retried this many times.
+METADATA_RETRIES = 2
+METADATA_RETRY_BACKOFF = 0.5
+
+def _is_retriable(exc) -> bool:
+    status = getattr(getattr(exc, 'resp', None), 'status', None)
+    return status is None or status == 429 or status >= 500
+
+async def _fetch_metadata_batch(service, message_ids: list[str]) -> tuple[list[dict], list[str]]:
+    email_list, failed = [], []
+    def callback(req_id, resp, exc):
+        if exc:
+            # A 404 means the message is gone; anything else may succeed on a retry.
+            if _is_retriable(exc): failed.append(req_id)
+        elif resp:
+            headers = mime_parser.index_headers(resp.get('payload', {}).get('headers', []))
+            subject, sender = headers.get('subject', 'No Subject'), headers.get('from', 'Unknown Sender')
+            email_list.append({'id': resp['id'], 'threadId': resp['threadId'], 'subject': subject, 'sender': sender, 'snippet': resp['snippet'], 'internalDate': int(resp.get('internalDate', 0))})
+    batch = service.new_batch_http_request(callback=callback)
+    for message_id in message_ids:
+        batch.add(service.users().messages().get(userId='me', id=message_id, format='metadata', metadataHeaders=['subject', 'from']), request_id=message_id)
+    await google_io.execute(batch)
+    return email_list, failed
+
+async def fetch_message_metadata(service, message_ids: list[str]) -> tuple[list[dict], list[str]]:
+    """Fetches subject/sender/snippet/internalDate for the given ids, newest first, plus the ids that kept failing.
+
+    Ids are split into batches of GMAIL_BATCH_LIMIT that run concurrently; callbacks fire in
+    completion order, so the result is sorted by internalDate afterwards.
+    """
+    emails, pending = [], list(message_ids)
+    for attempt in range(METADATA_RETRIES + 1):
+        if not pending: break
+        if attempt: await asyncio.sleep(METADATA_RETRY_BACKOFF * 2 ** (attempt - 1))
+        chunks = [pending[i:i + GMAIL_BATCH_LIMIT] for i in range(0, len(pending), GMAIL_BATCH_LIMIT)]
+        results = await asyncio.gather(*(_fetch_metadata_batch(service, chunk) for chunk in chunks))
+        emails.extend(email for chunk_emails, _ in results for email in chunk_emails)
+        pending = [message_id for _, chunk_failed in results for message_id in chunk_failed]
+    if pending: print(f"WARNING: metadata fetch failed for {len(pending)} messages after {METADATA_RETRIES} retries.")
+    return sorted(emails, key=lambda e: (e['internalDate'], e['id']), reverse=True), pending
+
+async def fetch_email_page(service, max_results: int = 20, page_token: str | None = None) -> tuple[list[dict], str | None]:
     try:
-        results = service.users().messages().list(userId='me', maxResults=max_results, q="in:inbox").execute()
-        messages = results.get('messages', []);
-        if not messages: return []
-        email_list = []
-        def callback(req_id, resp, exc):
-            if not exc and resp:
-                headers = resp.get('payload', {}).get('headers', [])
-                subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
-                sender = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown Sender')
-                email_list.append({'id': resp['id'], 'threadId': resp['threadId'], 'subject': subject, 'sender': sender, 'snippet': resp['snippet']})
-        batch = service.new_batch_http_request(callback=callback)
-        for msg in messages: batch.add(service.users().messages().get(userId='me', id=msg['id'], format='metadata', metadataHeaders=['subject', 'from']))
-        batch.execute()
-        return email_list
+        results = await google_io.execute(service.users().messages().list(userId='me', maxResults=max_results, q="in:inbox", pageToken=page_token))
+        messages = results.get('messages', [])
+        emails, _ = await fetch_message_metadata(service, [msg['id'] for msg in messages])
+        return emails, results.get('nextPageToken')
     except HttpError as error:
         print(f'An error occurred fetching emails: {error}'); raise
 
-async def fetch_single_email(service, message_id: str):
-    # (This function is unchanged)
+async def _fetch_single_email(service, message_id: str, user_id: int | None = None):
     try:
-        msg = service.users().messages().get(userId='me', id=message_id, format='full').execute()
-        payload = msg.get('payload', {}); headers = payload.get('headers', [])
-        subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
-        sender = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown Sender')
-        body_html, body_plain = None, "No text"; attachments = []
-        all_parts = get_all_parts(payload)
-        for part in all_parts:
-            if 'attachmentId' in part.get('body', {}):
-                filename = part.get('filename')
-                if not filename:
-                    for header in part.get('headers', []):
-                        if header.get('name', '').lower() == 'content-disposition':
-                            for p_str in header.get('value', '').split(';'):
-                                if p_str.strip().lower().startswith('filename='):
-                                    filename = p_str.split('=', 1)[1].strip().replace('"', '')
-                                    break
-                attachments.append({'id': part['body']['attachmentId'], 'filename': filename, 'mimeType': part.get('mimeType')})
-        if 'parts' in payload: body_html, body_plain = get_email_body(payload['parts'])
-        elif payload.get('body', {}).get('data'):
-            decoded = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8', errors='ignore')
-            if payload.get('mimeType') == 'text/html': body_html = decoded
-            else: body_plain = decoded
-        return {'id': msg['id'], 'threadId': msg['threadId'], 'subject': subject, 'sender': sender, 'snippet': msg['snippet'], 'body': body_html or body_plain, 'attachments': attachments}
+        msg = await google_io.execute(service.users().messages().get(userId='me', id=message_id, format='full'))
+        parsed = mime_parser.ParsedMessage(msg.get('payload', {}))
+        email = {'id': msg['id'], 'threadId': msg['threadId'], 'subject': parsed.header('subject', 'No Subject'),
+                 'sender': parsed.header('from', 'Unknown Sender'), 'snippet': msg['snippet'],
+                 'body': parsed.display_body() or "No text", 'attachments': parsed.attachments}
     except HttpError as error: print(f'An error fetching single email: {error}'); raise
+    if user_id is not None:
+        await search_index.index_messages(user_id, [{**email, 'internalDate': int(msg.get('internalDate', 0)),
+                                                     'body': thread_cleaner.clean_body(parsed.plain_body(), parsed.html_body())}])
+    return email
+
+def thread_messages(thread: dict) -> list[dict]:
+    messages = []
+    for message in thread.get('messages', []):
+        parsed = mime_parser.ParsedMessage(message.get('payload', {}))
+        messages.append({'id': message.get('id'), 'threadId': message.get('threadId', thread.get('id')),
+                         'subject': parsed.header('subject', 'No Subject'), 'sender': parsed.header('from', 'Unknown'),
+                         'date': parsed.header('date', 'Unknown Date'), 'snippet': message.get('snippet', ''),
+                         'internalDate': int(message.get('internalDate', 0)), 'plain': parsed.plain_body(), 'html': parsed.html_body()})
+    return messages
+
+def format_thread(messages: list[dict]) -> tuple[str, dict]:
+    """Prompt-ready thread text with quoted history and boilerplate removed, plus the token savings."""
+    with telemetry.span("thread_clean") as span:
+        text, savings = thread_cleaner.clean_thread(messages)
+        span.update(original_tokens=savings["original_tokens"], saved_tokens=savings["saved_tokens"])
+    return text, savings
 
-async def fetch_thread(service, thread_id: str) -> str:
-    # (This function is unchanged)
+async def _fetch_thread(service, thread_id: str, user_id: int | None = None) -> tuple[str, dict]:
     try:
-        thread = service.users().threads().get(userId='me', id=thread_id).execute()
-        combined_text = ""
-        for message in thread.get('messages', []):
-            payload = message.get('payload', {})
-            headers = payload.get('headers', [])
-            sender = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown')
-            date = next((h['value'] for h in headers if h['name'].lower() == 'date'), 'Unknown Date')
-            body_html, body_plain = get_email_body([payload])
-            clean_body = body_plain
-            if not clean_body and body_html:
-                clean_body = BeautifulSoup(body_html, 'lxml').get_text(separator='\n', strip=True)
-            combined_text += f"--- Email from {sender} on {date} ---\n{clean_body}\n\n"
-        return combined_text.strip()
+        thread = await google_io.execute(service.users().threads().get(userId='me', id=thread_id))
     except HttpError as error:
         print(f'An error occurred fetching thread: {error}')
-        return f"Error: Could not fetch thread. Details: {error}"
+        return f"Error: Could not fetch thread. Details: {error}", {}
+    messages = thread_messages(thread)
+    formatted = format_thread(messages)
+    if user_id is not None: await search_index.index_messages(user_id, messages)
+    return formatted
+
+async def fetch_single_email(service, message_id: str, user_id: int | None = None):
+    if user_id is None: return await _fetch_single_email(service, message_id)
+    return await email_flights.do((user_id, message_id), lambda: _fetch_single_email(service, message_id, user_id))
+
+async def fetch_thread(service, thread_id: str, user_id: int | None = None) -> tuple[str, dict]:
+    if user_id is None: return await _fetch_thread(service, thread_id)
+    return await thread_flights.do((user_id, thread_id), lambda: _fetch_thread(service, thread_id, user_id))
+
+async def _fetch_thread_batch(service, thread_ids: list[str], user_id: int | None) -> dict[str, tuple[str, dict]]:
+    threads, fetched = {}, []
+    def callback(req_id, resp, exc):
+        if exc: threads[req_id] = f"Error: Could not fetch thread. Details: {exc}", {}
+        elif resp:
+            messages = thread_messages(resp)
+            threads[req_id] = format_thread(messages); fetched.extend(messages)
+    batch = service.new_batch_http_request(callback=callback)
+    for thread_id in thread_ids: batch.add(service.users().threads().get(userId='me', id=thread_id), request_id=thread_id)
+    await google_io.execute(batch)
+    if user_id is not None: await search_index.index_messages(user_id, fetched)
+    return threads
+
+async def fetch_threads(service, thread_ids: list[str], user_id: int | None = None) -> dict[str, tuple[str, dict]]:
+    """Fetches and formats several threads through batch requests; failed threads map to ('Error: ...', {})."""
+    chunks = [thread_ids[i:i + GMAIL_BATCH_LIMIT] for i in range(0, len(thread_ids), GMAIL_BATCH_LIMIT)]
+    results = await asyncio.gather(*(_fetch_thread_batch(service, chunk, user_id) for chunk in chunks))
+    return {thread_id: text for chunk in results for thread_id, text in chunk.items()}
 
 async def send_email(service, to: str, subject: str, body: str):
-    # (This function is unchanged)
     try:
         message = MIMEText(body); message['to'] = to; message['subject'] = subject
         encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
         create_message = {'raw': encoded_message}
-        return service.users().messages().send(userId='me', body=create_message).execute()
+        return await google_io.execute(service.users().messages().send(userId='me', body=create_message))
     except HttpError as error: print(f'An error sending email: {error}'); raise
\ No newline at end of file
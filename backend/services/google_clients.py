@@ -0,0 +1,40 @@
+# backend/services/google_clients.py (Per-user cache of Gmail/Calendar service clients)
+import os
+import hashlib
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+from models import User
+from services import google_io
+from services.ttl_cache import TTLCache
+
+TOKEN_URI = 'https://oauth2.googleapis.com/token'
+_clients = TTLCache(
+    maxsize=int(os.getenv("GOOGLE_CLIENT_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("GOOGLE_CLIENT_CACHE_TTL", "1800")),
+)
+
+def build_credentials(user: User, scopes: list[str] | None = None) -> Credentials:
+    return Credentials(
+        token=user.oauth_access_token, refresh_token=user.oauth_refresh_token,
+        token_uri=TOKEN_URI, client_id=os.getenv("GOOGLE_CLIENT_ID"),
+        client_secret=os.getenv("GOOGLE_CLIENT_SECRET"), scopes=scopes, expiry=user.oauth_token_expiry
+    )
+
+def get_client(user: User, api: str, version: str, scopes: list[str] | None = None):
+    """Returns a cached service for (user, api, token), building it from the bundled discovery doc on a miss."""
+    token_hash = hashlib.sha256((user.oauth_access_token or "").encode()).hexdigest()[:16]
+    key = (user.id, api, version, token_hash)
+    service = _clients.get(key)
+    if service is None:
+        http = AuthorizedHttp(build_credentials(user, scopes), http=google_io.pooled_http)
+        service = build(api, version, http=http, static_discovery=True, cache_discovery=False)
+        _clients.set(key, service)
+    return service
+
+def invalidate_user(user_id: int | None):
+    """Drops every cached client for a user, e.g. after their OAuth tokens change."""
+    return _clients.pop_where(lambda key: key[0] == user_id)
+
+def stats() -> dict:
+    return _clients.stats()
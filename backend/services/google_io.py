@@ -0,0 +1,93 @@
+# backend/services/google_io.py (Async I/O layer for blocking Google API calls)
+import os
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httplib2
+from services import telemetry
+
+GOOGLE_IO_WORKERS = int(os.getenv("GOOGLE_IO_WORKERS", "16"))
+GOOGLE_IO_TIMEOUT = float(os.getenv("GOOGLE_IO_TIMEOUT", "30"))
+
+_executor = ThreadPoolExecutor(max_workers=GOOGLE_IO_WORKERS, thread_name_prefix="google-io")
+_lock = threading.Lock()
+_stats = {"queued": 0, "active": 0, "completed": 0, "failed": 0, "timed_out": 0, "max_queue_depth": 0, "total_wait_ms": 0.0, "total_run_ms": 0.0}
+
+class PooledHttp:
+    """httplib2.Http facade giving each pool thread its own keep-alive connection pool.
+
+    httplib2.Http is not thread-safe, so cached service objects share this facade
+    instead of a single Http instance; connections are reused across calls per thread.
+    """
+    def __init__(self, timeout: float):
+        self._timeout = timeout
+        self._local = threading.local()
+
+    def _http(self) -> httplib2.Http:
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = self._local.http = httplib2.Http(timeout=self._timeout)
+        return http
+
+    def request(self, *args, **kwargs):
+        return self._http().request(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._http(), name)
+
+pooled_http = PooledHttp(timeout=GOOGLE_IO_TIMEOUT)
+
+def _track(fn, submitted_at: float, *args, **kwargs):
+    started_at = time.perf_counter()
+    with _lock:
+        _stats["queued"] -= 1; _stats["active"] += 1
+        _stats["total_wait_ms"] += (started_at - submitted_at) * 1000
+    ok = False
+    try:
+        result = fn(*args, **kwargs); ok = True
+        return result
+    finally:
+        with _lock:
+            _stats["active"] -= 1
+            _stats["completed" if ok else "failed"] += 1
+            _stats["total_run_ms"] += (time.perf_counter() - started_at) * 1000
+
+def _dequeue_if_cancelled(future):
+    if future.cancelled():
+        with _lock: _stats["queued"] -= 1
+
+async def run_blocking(fn, *args, timeout: float | None = None, stage: str = "google_io", **kwargs):
+    """Runs a blocking callable on the Google I/O pool without stalling the event loop; timed as `stage`."""
+    with _lock:
+        _stats["queued"] += 1
+        _stats["max_queue_depth"] = max(_stats["max_queue_depth"], _stats["queued"])
+    future = _executor.submit(_track, fn, time.perf_counter(), *args, **kwargs)
+    # Only a call that never started can be cancelled, and then _track never ran to dequeue it. Timeouts,
+    # a cancelled awaiter (asyncio cancels the wrapped future) and shutdown all end up here.
+    future.add_done_callback(_dequeue_if_cancelled)
+    try:
+        with telemetry.span(stage):
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout or GOOGLE_IO_TIMEOUT)
+    except asyncio.TimeoutError:
+        # A running thread cannot be interrupted; a queued one can still be dropped.
+        future.cancel()
+        with _lock: _stats["timed_out"] += 1
+        raise
+
+async def execute(request, timeout: float | None = None, stage: str = "gmail"):
+    """Executes a googleapiclient HttpRequest/BatchHttpRequest off the event loop."""
+    return await run_blocking(request.execute, timeout=timeout, stage=stage)
+
+def stats() -> dict:
+    with _lock:
+        snapshot = dict(_stats)
+    done = snapshot["completed"] + snapshot["failed"]
+    snapshot["workers"] = GOOGLE_IO_WORKERS
+    total_wait_ms, total_run_ms = snapshot.pop("total_wait_ms"), snapshot.pop("total_run_ms")
+    snapshot["avg_wait_ms"] = round(total_wait_ms / done, 2) if done else 0.0
+    snapshot["avg_run_ms"] = round(total_run_ms / done, 2) if done else 0.0
+    return snapshot
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
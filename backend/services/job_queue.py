@@ -0,0 +1,100 @@
+# backend/services/job_queue.py (In-process asyncio job queue for slow AI/OCR work)
+import os
+import json
+import uuid
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from database import AsyncSessionLocal
+from models import BackgroundJob
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_RESULT_TTL = timedelta(seconds=int(os.getenv("JOB_RESULT_TTL_SECONDS", "3600")))
+# Persisting lets job status survive a restart; queued work itself is in-memory only.
+JOB_PERSIST = os.getenv("JOB_PERSIST", "false").lower() in ("1", "true", "yes")
+ACTIVE_STATUSES = ("queued", "running")
+
+_queue: asyncio.Queue | None = None
+_workers: list[asyncio.Task] = []
+_jobs: dict[str, BackgroundJob] = {}
+_inflight: dict[tuple, str] = {}
+_stats = {"submitted": 0, "deduplicated": 0, "succeeded": 0, "failed": 0}
+
+async def _persist(job: BackgroundJob):
+    if not JOB_PERSIST: return
+    try:
+        async with AsyncSessionLocal() as session:
+            await session.merge(job)  # merge copies state, so the in-memory job stays detached
+            await session.commit()
+    except Exception as e:
+        print(f"ERROR persisting job {job.id}: {e}")
+
+def _prune():
+    cutoff = datetime.utcnow() - JOB_RESULT_TTL
+    for job_id in [j.id for j in _jobs.values() if j.finished_at and j.finished_at < cutoff]:
+        del _jobs[job_id]
+
+async def _worker():
+    assert _queue is not None
+    while True:
+        job_id, factory, dedupe_key = await _queue.get()
+        job = _jobs[job_id]
+        job.status = "running"; await _persist(job)
+        try:
+            job.result = json.dumps(await factory())
+            job.status = "succeeded"; _stats["succeeded"] += 1
+        except Exception as e:
+            detail = getattr(e, "detail", None) or f"{type(e).__name__}: {e}"
+            job.error, job.status = str(detail)[:2048], "failed"; _stats["failed"] += 1
+            print(f"ERROR in background job {job.id} ({job.kind}): {detail}")
+        finally:
+            job.finished_at = datetime.utcnow()
+            _inflight.pop(dedupe_key, None)
+            _queue.task_done()
+        await _persist(job)
+        _prune()
+
+async def start():
+    global _queue
+    _queue = asyncio.Queue()
+    _workers.extend(asyncio.create_task(_worker()) for _ in range(JOB_WORKERS))
+    if JOB_PERSIST:
+        # Work queued before a restart cannot be resumed, so mark it as failed rather than leave it pending.
+        async with AsyncSessionLocal() as session:
+            await session.execute(update(BackgroundJob).where(BackgroundJob.status.in_(ACTIVE_STATUSES))  # type: ignore
+                                  .values(status="failed", error="Interrupted by a server restart.", finished_at=datetime.utcnow()))
+            await session.commit()
+
+async def stop():
+    for task in _workers: task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+async def submit(user_id: int, kind: str, dedupe_key: str, factory) -> BackgroundJob:
+    """Queues `factory` (an async callable returning a JSON-able result); an identical in-flight job is reused."""
+    if _queue is None: raise RuntimeError("Job queue is not running.")
+    key = (user_id, kind, dedupe_key)
+    existing = _jobs.get(_inflight.get(key, ""))
+    if existing is not None and existing.status in ACTIVE_STATUSES:
+        _stats["deduplicated"] += 1
+        return existing
+    job = BackgroundJob(id=uuid.uuid4().hex, user_id=user_id, kind=kind)
+    _jobs[job.id], _inflight[key] = job, job.id
+    await _persist(job)
+    _queue.put_nowait((job.id, factory, key))
+    _stats["submitted"] += 1
+    return job
+
+async def get_job(job_id: str, user_id: int) -> BackgroundJob | None:
+    job = _jobs.get(job_id)
+    if job is None and JOB_PERSIST:
+        async with AsyncSessionLocal() as session:
+            job = await session.get(BackgroundJob, job_id)
+    return job if job is not None and job.user_id == user_id else None
+
+def job_view(job: BackgroundJob) -> dict:
+    return {"id": job.id, "kind": job.kind, "status": job.status, "result": json.loads(job.result) if job.result else None,
+            "error": job.error, "created_at": job.created_at, "finished_at": job.finished_at}
+
+def stats() -> dict:
+    return {**_stats, "queued": _queue.qsize() if _queue else 0, "in_flight": len(_inflight), "workers": len(_workers)}
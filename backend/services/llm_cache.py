@@ -0,0 +1,51 @@
+# backend/services/llm_cache.py (Postgres-backed cache of Gemini responses)
+import os
+import hashlib
+from datetime import datetime, timedelta
+from sqlalchemy import delete
+from database import AsyncSessionLocal
+from models import LLMResponseCache
+
+LLM_CACHE_TTL = timedelta(hours=float(os.getenv("LLM_CACHE_TTL_HOURS", "168")))
+_stats = {"hits": 0, "misses": 0, "writes": 0, "errors": 0}
+
+def normalize_text(text: str) -> str:
+    """Whitespace-insensitive form, so re-sent HTML-to-text output hashes the same."""
+    return " ".join(text.split())
+
+def make_key(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+async def get(user_id: int | None, key: str) -> str | None:
+    if user_id is None: return None
+    try:
+        async with AsyncSessionLocal() as session:
+            row = await session.get(LLMResponseCache, (key, user_id))
+    except Exception as e:
+        _stats["errors"] += 1; print(f"ERROR reading LLM cache: {e}")
+        return None
+    if row is None or row.created_at < datetime.utcnow() - LLM_CACHE_TTL:
+        _stats["misses"] += 1
+        return None
+    _stats["hits"] += 1
+    return row.response
+
+async def put(user_id: int | None, key: str, response: str):
+    if user_id is None: return
+    try:
+        async with AsyncSessionLocal() as session:
+            await session.merge(LLMResponseCache(key=key, user_id=user_id, response=response, created_at=datetime.utcnow()))
+            await session.commit()
+        _stats["writes"] += 1
+    except Exception as e:
+        # Two identical requests racing to insert is harmless; the other writer's row wins.
+        _stats["errors"] += 1; print(f"ERROR writing LLM cache: {e}")
+
+async def purge_expired() -> int:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(delete(LLMResponseCache).where(LLMResponseCache.created_at < datetime.utcnow() - LLM_CACHE_TTL))
+        await session.commit()
+    return result.rowcount or 0
+
+def stats() -> dict:
+    return dict(_stats)
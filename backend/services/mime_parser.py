@@ -0,0 +1,74 @@
+# backend/services/mime_parser.py (Single-pass Gmail payload parser and HTML-to-text)
+import base64
+from lxml import etree, html as lxml_html
+
+_NON_TEXT_NODES = ('script', 'style', 'template', 'noscript', etree.Comment, etree.ProcessingInstruction)
+
+def decode_body(data: str) -> str:
+    return base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
+
+def index_headers(headers: list[dict]) -> dict[str, str]:
+    """Lower-cased header name -> first value, built once instead of a linear scan per lookup."""
+    indexed: dict[str, str] = {}
+    for header in headers:
+        indexed.setdefault(header.get('name', '').lower(), header.get('value', ''))
+    return indexed
+
+def html_to_text(markup: str) -> str:
+    """Visible text, one stripped string per line (same output shape as BeautifulSoup.get_text('\\n', strip=True))."""
+    if not markup or not markup.strip(): return ""
+    try:
+        root = lxml_html.fromstring(markup)
+    except (etree.ParserError, ValueError):
+        # e.g. an XML encoding declaration in a str; rare enough to take the slow path.
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(markup, 'lxml').get_text(separator='\n', strip=True)
+    etree.strip_elements(root, *_NON_TEXT_NODES, with_tail=False)
+    return "\n".join(text for text in (s.strip() for s in root.itertext()) if text)
+
+class ParsedMessage:
+    """One walk over a Gmail `payload`: headers indexed, parts flattened, bodies decoded only on demand."""
+    __slots__ = ("headers", "mime_type", "_attachments", "_html_part", "_plain_part")
+
+    def __init__(self, payload: dict):
+        self.headers = index_headers(payload.get('headers', []))
+        self.mime_type = payload.get('mimeType', '')
+        self._attachments: list[dict] = []
+        self._html_part = self._plain_part = None
+        # Pre-order depth-first walk with an explicit stack (no recursion, no O(n) list.pop(0)).
+        stack = [payload]
+        while stack:
+            part = stack.pop()
+            body = part.get('body', {})
+            if 'attachmentId' in body:
+                self._attachments.append({'id': body['attachmentId'], 'filename': part.get('filename') or _disposition_filename(part), 'mimeType': part.get('mimeType'), 'partId': part.get('partId')})
+            elif body.get('data'):
+                mime_type = part.get('mimeType', '')
+                # Later parts win, matching how the dashboard has always picked the body.
+                if mime_type == 'text/html': self._html_part = part
+                elif mime_type == 'text/plain' or part is payload: self._plain_part = part
+            stack.extend(reversed(part.get('parts', ())))
+
+    def header(self, name: str, default: str = '') -> str:
+        return self.headers.get(name, default)
+
+    @property
+    def attachments(self) -> list[dict]:
+        return self._attachments
+
+    def html_body(self) -> str | None:
+        return decode_body(self._html_part['body']['data']) if self._html_part else None
+
+    def plain_body(self) -> str | None:
+        return decode_body(self._plain_part['body']['data']) if self._plain_part else None
+
+    def display_body(self) -> str | None:
+        """HTML if present (for rendering), otherwise plain text."""
+        return self.html_body() or self.plain_body()
+
+def _disposition_filename(part: dict) -> str | None:
+    disposition = index_headers(part.get('headers', [])).get('content-disposition', '')
+    for param in disposition.split(';'):
+        if param.strip().lower().startswith('filename='):
+            return param.split('=', 1)[1].strip().replace('"', '')
+    return None
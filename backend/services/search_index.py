@@ -0,0 +1,120 @@
+# backend/services/search_index.py (Postgres full-text index over synced mail, opened bodies and thread summaries)
+# Documents cover every message the user has synced or opened, whatever its labels: archived mail stays
+# searchable. Only deleted, trashed or spam messages are removed.
+import os
+import html
+import json
+from datetime import datetime
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from models import SearchDocument
+
+# Must match the config baked into SearchDocument.search_vector.
+TEXT_SEARCH_CONFIG = "english"
+# A tsvector is capped at 1 MB; the start of a message is what people search for anyway.
+SEARCH_BODY_MAX_CHARS = int(os.getenv("SEARCH_BODY_MAX_CHARS", "100000"))
+SEARCH_MAX_PAGE_SIZE = 50
+# ts_headline copies the email text verbatim, so it marks matches with control characters; the text is
+# HTML-escaped in Python and only then are the markers turned into <mark> tags.
+_MARK_START, _MARK_STOP = "\x02", "\x03"
+HEADLINE_OPTIONS = f"StartSel={_MARK_START}, StopSel={_MARK_STOP}, MaxFragments=2, MaxWords=30, MinWords=10"
+METADATA_COLUMNS = ("threadId", "subject", "sender", "snippet", "internalDate")
+# asyncpg allows 32767 bind parameters per statement.
+UPSERT_CHUNK = 1000
+
+_stats = {"documents_indexed": 0, "summaries_indexed": 0, "documents_removed": 0, "searches": 0, "errors": 0}
+
+def _highlight(headline: str | None) -> str:
+    escaped = html.escape(headline or "")
+    return escaped.replace(_MARK_START, "<mark>").replace(_MARK_STOP, "</mark>")
+
+def _row(user_id: int, document: dict, columns: tuple[str, ...]) -> dict:
+    row = {"user_id": user_id, "message_id": document["id"], "updated_at": datetime.utcnow()}
+    row.update({column: document[column] for column in columns})
+    if "body" in row: row["body"] = row["body"][:SEARCH_BODY_MAX_CHARS]
+    return row
+
+async def _upsert(session: AsyncSession, user_id: int, documents: list[dict], columns: tuple[str, ...]):
+    """Inserts or updates only `columns`, so a metadata refresh never wipes an indexed body or summary."""
+    for i in range(0, len(documents), UPSERT_CHUNK):
+        statement = insert(SearchDocument).values([_row(user_id, d, columns) for d in documents[i:i + UPSERT_CHUNK]])
+        statement = statement.on_conflict_do_update(
+            index_elements=[SearchDocument.user_id, SearchDocument.message_id],
+            set_={column: statement.excluded[column] for column in (*columns, "updated_at")})
+        await session.execute(statement)
+    _stats["documents_indexed"] += len(documents)
+
+async def index_metadata(session: AsyncSession, user_id: int, emails: list[dict]):
+    """Indexes inbox listing rows ({id, threadId, subject, sender, snippet, internalDate}) in the caller's transaction."""
+    if emails: await _upsert(session, user_id, emails, METADATA_COLUMNS)
+
+async def remove(session: AsyncSession, user_id: int, message_ids: set[str]):
+    if not message_ids: return
+    await session.execute(delete(SearchDocument).where(SearchDocument.user_id == user_id, SearchDocument.message_id.in_(message_ids)))  # type: ignore[attr-defined]
+    _stats["documents_removed"] += len(message_ids)
+
+async def index_messages(user_id: int, documents: list[dict]):
+    """Indexes fetched messages with their cleaned `body`. Failures are logged, never raised to the request."""
+    if not documents: return
+    try:
+        async with AsyncSessionLocal() as session:
+            await _upsert(session, user_id, documents, (*METADATA_COLUMNS, "body"))
+            await session.commit()
+    except Exception as e:
+        _stats["errors"] += 1; print(f"ERROR indexing messages for search: {e}")
+
+def summary_text(summary_json: str) -> str | None:
+    """Flattens a briefing JSON into searchable text; None for errors and unparseable output."""
+    try:
+        briefing = json.loads(summary_json)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(briefing, dict) or "error" in briefing or not briefing.get("summary"): return None
+    lines = [str(briefing["summary"])]
+    for field in ("action_items", "key_dates", "participants"):
+        values = briefing.get(field)
+        if isinstance(values, list): lines.extend(str(value) for value in values)
+    return "\n".join(lines)
+
+async def index_summary(user_id: int, thread_id: str, summary_json: str):
+    """Attaches a thread briefing to every indexed message of the thread."""
+    text = summary_text(summary_json)
+    if text is None: return
+    try:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(update(SearchDocument).where(
+                SearchDocument.user_id == user_id, SearchDocument.threadId == thread_id,
+                SearchDocument.summary != text).values(summary=text, updated_at=datetime.utcnow()))
+            await session.commit()
+        _stats["summaries_indexed"] += result.rowcount or 0
+    except Exception as e:
+        _stats["errors"] += 1; print(f"ERROR indexing summary for search: {e}")
+
+async def search(session: AsyncSession, user_id: int, query: str, page_size: int, offset: int = 0) -> tuple[list[dict], int | None]:
+    """Ranked matches for a web-style query ("quoted phrase", -exclude, or), newest first among equal ranks.
+
+    Returns one page and the offset of the next one (None on the last page). Headlines are built only for
+    the rows on the page, since ts_headline re-parses the document text.
+    """
+    _stats["searches"] += 1
+    tsquery = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, query)
+    rank = func.ts_rank(SearchDocument.search_vector, tsquery).label("rank")
+    page = (select(SearchDocument.message_id, rank)
+            .where(SearchDocument.user_id == user_id, SearchDocument.search_vector.op("@@")(tsquery))
+            .order_by(rank.desc(), SearchDocument.internalDate.desc(), SearchDocument.message_id)
+            .offset(offset).limit(page_size + 1).subquery())
+    source = func.concat_ws(" ", SearchDocument.summary, SearchDocument.snippet, SearchDocument.body)
+    statement = (select(SearchDocument.message_id, SearchDocument.threadId, SearchDocument.subject, SearchDocument.sender,
+                        SearchDocument.snippet, SearchDocument.internalDate, page.c.rank,
+                        func.ts_headline(TEXT_SEARCH_CONFIG, source, tsquery, HEADLINE_OPTIONS).label("highlight"))
+                 .join(page, (SearchDocument.user_id == user_id) & (SearchDocument.message_id == page.c.message_id))
+                 .order_by(page.c.rank.desc(), SearchDocument.internalDate.desc(), SearchDocument.message_id))
+    rows = (await session.execute(statement)).all()
+    results = [{'id': r.message_id, 'threadId': r.threadId, 'subject': r.subject, 'sender': r.sender, 'snippet': r.snippet,
+                'internalDate': r.internalDate, 'rank': round(float(r.rank), 4), 'highlight': _highlight(r.highlight)} for r in rows[:page_size]]
+    return results, (offset + page_size if len(rows) > page_size else None)
+
+def stats() -> dict:
+    return dict(_stats)
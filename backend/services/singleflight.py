@@ -0,0 +1,31 @@
+# backend/services/singleflight.py (Request coalescing for identical in-flight calls)
+import asyncio
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers with the same key share its result."""
+    def __init__(self):
+        self._calls: dict = {}
+        self.executed = self.shared = 0
+
+    async def do(self, key, factory):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+            self.executed += 1
+        else:
+            self.shared += 1
+        # Shielded so one caller going away does not cancel the call the others are waiting on.
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task: asyncio.Future):
+        if self._calls.get(key) is task: del self._calls[key]
+        # Mark the exception retrieved even if every waiter was cancelled.
+        if not task.cancelled(): task.exception()
+
+    def __len__(self):
+        return len(self._calls)
+
+    def stats(self) -> dict:
+        return {"executed": self.executed, "shared": self.shared, "in_flight": len(self._calls)}
@@ -0,0 +1,142 @@
+# backend/services/sync_service.py (Incremental inbox sync via Gmail history IDs)
+import os
+import asyncio
+from datetime import datetime
+from googleapiclient.errors import HttpError
+from sqlalchemy import delete, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+from models import MailboxSyncState, MessageMetadata
+from services import google_io, gmail_service, search_index
+
+INBOX_SYNC_WINDOW = int(os.getenv("INBOX_SYNC_WINDOW", "50"))
+GMAIL_LIST_MAX_RESULTS = 500
+LOCAL_CURSOR_PREFIX = "local:"
+HISTORY_TYPES = ['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved']
+
+_user_locks: dict[int, asyncio.Lock] = {}
+_stats = {"full_syncs": 0, "delta_syncs": 0, "messages_added": 0, "messages_removed": 0, "delta_retries_pending": 0}
+
+async def _full_sync(service, session: AsyncSession, user_id: int, state: MailboxSyncState):
+    # Read the historyId first so anything arriving during the listing shows up in the next delta.
+    profile = await google_io.execute(service.users().getProfile(userId='me'))
+    emails, next_page_token = await gmail_service.fetch_email_page(service, max_results=INBOX_SYNC_WINDOW)
+    await session.execute(delete(MessageMetadata).where(MessageMetadata.user_id == user_id))
+    for email in emails: session.add(MessageMetadata(user_id=user_id, **email))
+    # Search documents outlive the sync window; only their metadata is refreshed here.
+    await search_index.index_metadata(session, user_id, emails)
+    state.history_id = str(profile['historyId'])
+    state.next_page_token = next_page_token
+    _stats["full_syncs"] += 1; _stats["messages_added"] += len(emails)
+
+async def _refresh_page_token(service, session: AsyncSession, user_id: int, state: MailboxSyncState):
+    """Re-lists past the locally synced rows so the Gmail pageToken handed out after them matches today's inbox.
+
+    A token saved at full-sync time describes the listing as it was then; once deltas change which
+    messages sit in the window, paging on from it would skip or repeat some. The store is trimmed to
+    INBOX_SYNC_WINDOW rows, so this is a single list call.
+    """
+    remaining = (await session.execute(select(func.count()).select_from(MessageMetadata).where(MessageMetadata.user_id == user_id))).scalar_one()
+    page_token = None
+    while remaining > 0:
+        page_size = min(remaining, GMAIL_LIST_MAX_RESULTS)
+        results = await google_io.execute(service.users().messages().list(userId='me', maxResults=page_size, q="in:inbox", pageToken=page_token))
+        page_token, remaining = results.get('nextPageToken'), remaining - page_size
+        if not page_token: break
+    state.next_page_token = page_token
+
+async def _window_ids(session: AsyncSession, user_id: int) -> set[str]:
+    return set((await session.execute(select(MessageMetadata.id).where(MessageMetadata.user_id == user_id))).scalars().all())
+
+async def _trim_to_window(session: AsyncSession, user_id: int):
+    """Keeps only the newest INBOX_SYNC_WINDOW rows, so the local store stays the top of the inbox and never grows."""
+    newest = (select(MessageMetadata.id).where(MessageMetadata.user_id == user_id)
+              .order_by(MessageMetadata.internalDate.desc(), MessageMetadata.id.desc()).limit(INBOX_SYNC_WINDOW))  # type: ignore
+    await session.execute(delete(MessageMetadata).where(MessageMetadata.user_id == user_id, MessageMetadata.id.not_in(newest)))  # type: ignore[attr-defined]
+
+async def _delta_sync(service, session: AsyncSession, user_id: int, state: MailboxSyncState):
+    added, removed, deleted = set(), set(), set()
+    latest_history_id, page_token = state.history_id, None
+    while True:
+        response = await google_io.execute(service.users().history().list(
+            userId='me', startHistoryId=state.history_id, labelId='INBOX', historyTypes=HISTORY_TYPES, pageToken=page_token))
+        for record in response.get('history', []):
+            # labelsAdded only counts when INBOX itself was added; starring or labelling an older message must not pull it in.
+            arrived = record.get('messagesAdded', []) + [c for c in record.get('labelsAdded', []) if 'INBOX' in c.get('labelIds', [])]
+            for change in arrived:
+                if 'INBOX' in change['message'].get('labelIds', []):
+                    message_id = change['message']['id']
+                    added.add(message_id); removed.discard(message_id); deleted.discard(message_id)
+            for change in record.get('labelsRemoved', []):
+                if 'INBOX' not in change.get('labelIds', []): continue
+                message_id = change['message']['id']
+                removed.add(message_id); added.discard(message_id)
+                # Archived mail stays searchable; trashed or spam mail leaves the search index too.
+                if {'TRASH', 'SPAM'} & set(change['message'].get('labelIds', [])): deleted.add(message_id)
+            for change in record.get('messagesDeleted', []):
+                message_id = change['message']['id']
+                removed.add(message_id); added.discard(message_id); deleted.add(message_id)
+        latest_history_id = response.get('historyId', latest_history_id)
+        page_token = response.get('nextPageToken')
+        if not page_token: break
+    window_before = await _window_ids(session, user_id) if added or removed else set()
+    if removed:
+        await session.execute(delete(MessageMetadata).where(MessageMetadata.user_id == user_id, MessageMetadata.id.in_(removed)))
+    await search_index.remove(session, user_id, deleted)
+    emails, failed = await gmail_service.fetch_message_metadata(service, sorted(added))
+    for email in emails: await session.merge(MessageMetadata(user_id=user_id, **email))
+    await search_index.index_metadata(session, user_id, emails)
+    if added or removed:
+        await _trim_to_window(session, user_id)
+        # Changes below the window (an old message archived or restored) leave the saved token valid.
+        if await _window_ids(session, user_id) != window_before: await _refresh_page_token(service, session, user_id, state)
+    if failed:
+        # Keep the old historyId so the next delta replays these changes; merges and deletes are idempotent.
+        _stats["delta_retries_pending"] += 1
+        print(f"WARNING: {len(failed)} added messages could not be fetched for user {user_id}; history not advanced.")
+    else:
+        state.history_id = str(latest_history_id)
+    _stats["delta_syncs"] += 1; _stats["messages_added"] += len(added); _stats["messages_removed"] += len(removed)
+
+async def sync_inbox(service, session: AsyncSession, user_id: int):
+    """Brings the local MessageMetadata store up to date: a delta via history.list, or a full listing the first time."""
+    async with _user_locks.setdefault(user_id, asyncio.Lock()):
+        state = await session.get(MailboxSyncState, user_id) or MailboxSyncState(user_id=user_id)
+        try:
+            if state.history_id: await _delta_sync(service, session, user_id, state)
+            else: await _full_sync(service, session, user_id, state)
+        except HttpError as error:
+            # A 404 means the stored historyId is too old for Gmail to replay; start over.
+            if error.resp.status != 404: raise
+            print(f"INFO: historyId for user {user_id} expired, running a full inbox sync.")
+            await _full_sync(service, session, user_id, state)
+        state.synced_at = datetime.utcnow()
+        session.add(state)
+        await session.commit()
+
+def _as_dict(row: MessageMetadata) -> dict:
+    return {'id': row.id, 'threadId': row.threadId, 'subject': row.subject, 'sender': row.sender, 'snippet': row.snippet, 'internalDate': row.internalDate}
+
+def is_local_cursor(page_token: str | None) -> bool:
+    return bool(page_token) and page_token.startswith(LOCAL_CURSOR_PREFIX)
+
+async def inbox_page(session: AsyncSession, user_id: int, page_size: int, cursor: str | None = None) -> tuple[list[dict], str | None]:
+    """Serves a page of the synced inbox, newest first, with keyset pagination on (internalDate, id).
+
+    Once the local rows run out, the returned token is Gmail's own pageToken for the rest of the
+    inbox, so the client keeps paging transparently through live Gmail results.
+    """
+    statement = select(MessageMetadata).where(MessageMetadata.user_id == user_id)
+    if cursor:
+        internal_date, _, message_id = cursor[len(LOCAL_CURSOR_PREFIX):].partition(":")
+        statement = statement.where(tuple_(MessageMetadata.internalDate, MessageMetadata.id) < (int(internal_date), message_id))
+    statement = statement.order_by(MessageMetadata.internalDate.desc(), MessageMetadata.id.desc()).limit(page_size + 1)  # type: ignore
+    rows = (await session.execute(statement)).scalars().all()
+    if len(rows) > page_size:
+        last = rows[page_size - 1]
+        return [_as_dict(r) for r in rows[:page_size]], f"{LOCAL_CURSOR_PREFIX}{last.internalDate}:{last.id}"
+    state = await session.get(MailboxSyncState, user_id)
+    return [_as_dict(r) for r in rows], state.next_page_token if state else None
+
+def stats() -> dict:
+    return dict(_stats)
@@ -0,0 +1,202 @@
+# backend/services/telemetry.py (Per-request tracing, stage spans and Prometheus exposition)
+import os
+import re
+import json
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+
+TRACE_SLOW_REQUEST_MS = float(os.getenv("TRACE_SLOW_REQUEST_MS", "2000"))
+METRICS_PREFIX = "bharath"
+# Seconds; spans range from sub-millisecond DB queries to multi-minute OCR jobs.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+try:  # OpenTelemetry is optional: spans are exported only when the SDK is installed and configured.
+    from opentelemetry import trace as _otel_trace
+    _tracer = _otel_trace.get_tracer("bharath-ai") if os.getenv("OTEL_ENABLED", "true").lower() in ("1", "true", "yes") else None
+except ImportError:
+    _tracer = None
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts, self.sum, self.count = [0] * len(BUCKETS), 0.0, 0
+
+    def observe(self, seconds: float):
+        self.sum += seconds; self.count += 1
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound: self.counts[i] += 1; break
+
+class RequestTrace:
+    """Per-request accumulator of stage timings; shared by every task the request spawns."""
+    __slots__ = ("trace_id", "method", "scope", "stages")
+
+    def __init__(self, method: str, scope: dict):
+        self.trace_id, self.method, self.scope = uuid.uuid4().hex[:16], method, scope
+        self.stages: dict[str, list] = {}
+
+    @property
+    def route(self) -> str:
+        return route_label(self.scope)
+
+    def add(self, stage: str, seconds: float):
+        totals = self.stages.setdefault(stage, [0, 0.0])
+        totals[0] += 1; totals[1] += seconds
+
+_current: contextvars.ContextVar[RequestTrace | None] = contextvars.ContextVar("request_trace", default=None)
+_lock = threading.Lock()
+_requests: dict[tuple[str, str], Histogram] = {}
+_responses: dict[tuple[str, str, int], int] = {}
+_stages: dict[tuple[str, str], Histogram] = {}
+_stage_errors: dict[tuple[str, str], int] = {}
+_stage_totals: dict[tuple[str, str, str], float] = {}
+_route_paths: dict = {}
+
+def route_label(scope: dict) -> str:
+    """The matched route template (e.g. /api/gmail/email/{message_id}) so label cardinality stays bounded."""
+    endpoint = scope.get("endpoint")
+    if endpoint is None: return "unmatched"
+    path = _route_paths.get(endpoint)
+    if path is None:
+        app = scope.get("app")
+        for route in getattr(app, "routes", ()):
+            if getattr(route, "endpoint", None) is endpoint: path = _route_paths[endpoint] = route.path; break
+    return path or getattr(endpoint, "__name__", "unknown")
+
+def record(stage: str, seconds: float, error: bool = False, trace: RequestTrace | None = None, **amounts):
+    """Records one finished unit of work; numeric `amounts` (bytes, tokens, pages...) are summed per stage."""
+    trace = trace or _current.get()
+    key = (stage, trace.route if trace else "background")
+    with _lock:
+        _stages.setdefault(key, Histogram()).observe(seconds)
+        if error: _stage_errors[key] = _stage_errors.get(key, 0) + 1
+        for name, amount in amounts.items():
+            if isinstance(amount, (int, float)) and not isinstance(amount, bool):
+                total_key = (name, *key)
+                _stage_totals[total_key] = _stage_totals.get(total_key, 0) + amount
+        if trace: trace.add(stage, seconds)
+
+@contextmanager
+def span(stage: str, **attributes):
+    """Times the enclosed block as `stage`; yields a dict the block can add sizes or token counts to."""
+    trace = _current.get()
+    start, error = time.perf_counter(), False
+    with (_tracer.start_as_current_span(stage) if _tracer else nullcontext()) as otel_span:
+        try:
+            yield attributes
+        except BaseException:
+            error = True
+            raise
+        finally:
+            record(stage, time.perf_counter() - start, error, trace, **attributes)
+            if otel_span is not None:
+                for name, value in attributes.items():
+                    if isinstance(value, (str, bool, int, float)): otel_span.set_attribute(f"bharath.{name}", value)
+
+class TracingMiddleware:
+    """ASGI middleware: one RequestTrace per HTTP request, a Server-Timing header, and a log line for slow requests."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trace = RequestTrace(scope["method"], scope)
+        token = _current.set(trace)
+        start, status = time.perf_counter(), 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Streamed responses only report the stages that finished before the first byte.
+                timing = ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, (_, seconds) in trace.stages.items())
+                headers = list(message.get("headers", [])) + [(b"x-trace-id", trace.trace_id.encode())]
+                if timing: headers.append((b"server-timing", timing.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self._finish(trace, status, time.perf_counter() - start)
+
+    @staticmethod
+    def _finish(trace: RequestTrace, status: int, seconds: float):
+        route = trace.route
+        with _lock:
+            _requests.setdefault((route, trace.method), Histogram()).observe(seconds)
+            _responses[(route, trace.method, status)] = _responses.get((route, trace.method, status), 0) + 1
+        if seconds * 1000 >= TRACE_SLOW_REQUEST_MS:
+            stages = {stage: {"calls": calls, "ms": round(total * 1000, 1)} for stage, (calls, total) in trace.stages.items()}
+            print("SLOW REQUEST: " + json.dumps({"trace_id": trace.trace_id, "method": trace.method, "route": route,
+                                                 "status": status, "ms": round(seconds * 1000, 1), "stages": stages}))
+
+def stats() -> dict:
+    """Per-stage totals for the JSON metrics endpoint."""
+    with _lock:
+        stages: dict[str, dict] = {}
+        for (stage, _), histogram in _stages.items():
+            entry = stages.setdefault(stage, {"calls": 0, "errors": 0, "total_ms": 0.0})
+            entry["calls"] += histogram.count; entry["total_ms"] += histogram.sum * 1000
+        for (stage, _), errors in _stage_errors.items(): stages[stage]["errors"] += errors
+        for (name, stage, _), amount in _stage_totals.items():
+            stages[stage][name] = stages[stage].get(name, 0) + amount
+    for entry in stages.values():
+        entry["avg_ms"] = round(entry["total_ms"] / entry["calls"], 2) if entry["calls"] else 0.0
+        entry["total_ms"] = round(entry["total_ms"], 1)
+    return stages
+
+# --- Prometheus text exposition (format 0.0.4) ---
+def _name(*parts: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", "_".join((METRICS_PREFIX, *parts)))
+
+def _labels(**labels) -> str:
+    escaped = (f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+    return "{" + ",".join(escaped) + "}"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _histogram_lines(name: str, series: dict, label_names: tuple[str, ...]) -> list[str]:
+    lines = [f"# TYPE {name} histogram"]
+    for key, histogram in sorted(series.items()):
+        labels = dict(zip(label_names, key))
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {histogram.count}")
+        lines.append(f"{name}_sum{_labels(**labels)} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+    return lines
+
+def _flatten(prefix: tuple[str, ...], values: dict, out: dict[str, float]):
+    for key, value in values.items():
+        if isinstance(value, dict): _flatten((*prefix, str(key)), value, out)
+        elif isinstance(value, (int, float)): out[_name(*prefix, str(key))] = float(value)
+
+def render_prometheus(service_stats: dict | None = None) -> str:
+    """Request and stage histograms, plus every numeric value in `service_stats` as a gauge."""
+    with _lock:
+        requests, responses, stages = dict(_requests), dict(_responses), dict(_stages)
+        stage_errors, stage_totals = dict(_stage_errors), dict(_stage_totals)
+    lines = _histogram_lines(_name("http_request_duration_seconds"), requests, ("route", "method"))
+    lines.append(f"# TYPE {_name('http_responses_total')} counter")
+    lines += [f"{_name('http_responses_total')}{_labels(route=r, method=m, status=s)} {n}" for (r, m, s), n in sorted(responses.items())]
+    lines += _histogram_lines(_name("stage_duration_seconds"), stages, ("stage", "route"))
+    lines.append(f"# TYPE {_name('stage_errors_total')} counter")
+    lines += [f"{_name('stage_errors_total')}{_labels(stage=s, route=r)} {n}" for (s, r), n in sorted(stage_errors.items())]
+    for amount in sorted({name for name, _, _ in stage_totals}):
+        metric = _name("stage", amount, "total")
+        lines.append(f"# TYPE {metric} counter")
+        lines += [f"{metric}{_labels(stage=s, route=r)} {v}" for (name, s, r), v in sorted(stage_totals.items()) if name == amount]
+    gauges: dict[str, float] = {}
+    _flatten((), service_stats or {}, gauges)
+    for metric, value in gauges.items():
+        lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,105 @@
+# backend/services/thread_cleaner.py (Strips quoted history, signatures and boilerplate from threads before summarization)
+import os
+import re
+from lxml import etree, html as lxml_html
+from services import mime_parser
+from services.ai_service import estimate_tokens
+
+THREAD_CLEANING = os.getenv("THREAD_CLEANING", "true").lower() in ("1", "true", "yes")
+# Shorter paragraphs ("Thanks,", "Sounds good") repeat legitimately and are cheap; only longer ones are deduplicated.
+MIN_DEDUPE_CHARS = 40
+NO_NEW_CONTENT = "[No new content; only quoted text from earlier messages]"
+
+# Everything after one of these lines is the quoted earlier conversation.
+_REPLY_HEADERS = re.compile(
+    r"^\s*(?:"
+    r"On\b[^\n]{0,300}?(?:\n[^\n]{0,200}?)?\bwrote:"            # Gmail/Apple: On Mon, 6 Oct 2025, Alice <a@x> wrote:
+    r"|Le\b[^\n]{0,300}?a écrit\s*:|Am\b[^\n]{0,300}?schrieb[^\n]*:|El\b[^\n]{0,300}?escribió:"
+    r"|-{2,}\s*Original Message\s*-{2,}"
+    r"|_{10,}\s*\n\s*From:|From:[^\n]+\n\s*Sent:[^\n]+"         # Outlook
+    r")\s*$", re.IGNORECASE | re.MULTILINE)
+# RFC 3676 "-- " only: a bare "--" is as often a divider in the message itself.
+_SIGNATURE_DELIMITER = re.compile(r"^-- $", re.MULTILINE)
+_MOBILE_FOOTERS = re.compile(r"^\s*(?:Sent from my \w+.*|Get Outlook for \w+.*|Sent from Mail for Windows.*)$", re.IGNORECASE | re.MULTILINE)
+# Footer wording, not single keywords: "please don't unsubscribe" or "this is confidential" in a reply is content.
+_FOOTER_PHRASES = re.compile(
+    r"(?:click|tap)\s+here\s+to\s+unsubscribe|\bto\s+unsubscribe,?\s+(?:click|tap|visit|reply|follow|go|use|please)\b"
+    r"|unsubscribe\s+(?:here|link|from\s+(?:this|these|our|all|future))\b"
+    r"|you\s+(?:are\s+receiving|received)\s+this\s+(?:e-?mail|message)|manage\s+your\s+(?:e-?mail\s+)?(?:preferences|subscriptions)"
+    r"|this\s+(?:e-?mail|message|communication)[^.]{0,80}?\b(?:is|are|may\s+contain|contains?)\b[^.]{0,60}?(?:confidential|privileged)"
+    r"|intended\s+(?:solely|only|exclusively)\s+for\s+the\s+(?:use\s+of\s+the\s+)?(?:addressee|named|intended|individual|recipient|person)"
+    r"|if\s+you\s+(?:are\s+not\s+the\s+intended\s+recipient|have\s+received\s+this\s+(?:e-?mail|message|communication)\s+in\s+error)",
+    re.IGNORECASE)
+# Quote containers in HTML mail: Gmail, Apple Mail/Thunderbird, Yahoo, Outlook (whose reply header starts the quote).
+_HTML_QUOTES = etree.XPath(
+    "//div[contains(concat(' ', normalize-space(@class), ' '), ' gmail_quote ')]"
+    " | //blockquote | //div[contains(@class, 'yahoo_quoted')]"
+    " | //div[@id='divRplyFwdMsg'] | //div[@id='divRplyFwdMsg']/following-sibling::*"
+    " | //div[@id='appendonsend']/following-sibling::*")
+
+def strip_html_quotes(markup: str) -> str:
+    """Visible text of an HTML body without its quoted-reply containers."""
+    try:
+        root = lxml_html.fromstring(markup)
+    except (etree.ParserError, ValueError):
+        return mime_parser.html_to_text(markup)
+    for element in _HTML_QUOTES(root):
+        if element.getparent() is not None: element.drop_tree()
+    return mime_parser.html_to_text(lxml_html.tostring(root, encoding="unicode"))
+
+def strip_quoted_history(text: str) -> str:
+    """Drops everything from the first reply header ("On ... wrote:") and any '>' lines."""
+    header = _REPLY_HEADERS.search(text)
+    if header: text = text[:header.start()]
+    return "\n".join(line for line in text.splitlines() if not line.lstrip().startswith(">"))
+
+def strip_boilerplate(text: str) -> str:
+    """Drops the signature after '-- ' and trailing legal or mobile-client footers."""
+    signature = _SIGNATURE_DELIMITER.search(text)
+    if signature: text = text[:signature.start()]
+    text = _MOBILE_FOOTERS.sub("", text)
+    paragraphs = _paragraphs(text)
+    # Footers sit at the end of a message; one that is all there is, is the message.
+    while len(paragraphs) > 1 and _FOOTER_PHRASES.search(paragraphs[-1]): paragraphs.pop()
+    return "\n\n".join(paragraphs)
+
+def clean_body(plain: str | None, markup: str | None, keep_quotes: bool = False) -> str:
+    """A message's own text: quoted history (unless keep_quotes), signature and footers removed."""
+    if keep_quotes: return strip_boilerplate(plain or (mime_parser.html_to_text(markup) if markup else ""))
+    return strip_boilerplate(strip_quoted_history(plain) if plain else strip_html_quotes(markup) if markup else "")
+
+def _paragraphs(text: str) -> list[str]:
+    return [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+
+def _fingerprint(paragraph: str) -> str:
+    return re.sub(r"\W+", " ", paragraph).strip().lower()
+
+def clean_thread(messages: list[dict]) -> tuple[str, dict]:
+    """Formats messages ({sender, date, plain, html}) into prompt text; returns (text, token stats).
+
+    Each message's own cleaned text, before cross-message deduplication, is stored under its "body" key.
+    """
+    original_parts, cleaned_parts, seen = [], [], set()
+    for index, message in enumerate(messages):
+        plain, markup = message.get("plain"), message.get("html")
+        original = plain or (mime_parser.html_to_text(markup) if markup else "")
+        heading = f"--- Email from {message['sender']} on {message['date']} ---"
+        original_parts.append(f"{heading}\n{original}")
+        # Whatever the first message quotes (or forwards) is not repeated anywhere else in the thread.
+        message["body"] = body = clean_body(plain, markup, keep_quotes=index == 0)
+        if not THREAD_CLEANING:
+            cleaned_parts.append(f"{heading}\n{original}"); continue
+        kept = []
+        for paragraph in _paragraphs(body):
+            fingerprint = _fingerprint(paragraph)
+            if len(fingerprint) >= MIN_DEDUPE_CHARS:
+                if fingerprint in seen: continue
+                seen.add(fingerprint)
+            kept.append(paragraph)
+        cleaned_parts.append(f"{heading}\n" + ("\n\n".join(kept) or NO_NEW_CONTENT))
+    original_text, cleaned_text = "\n\n".join(original_parts), "\n\n".join(cleaned_parts)
+    original_tokens, cleaned_tokens = estimate_tokens(original_text), estimate_tokens(cleaned_text)
+    stats = {"messages": len(messages), "original_tokens": original_tokens, "cleaned_tokens": cleaned_tokens,
+             "saved_tokens": original_tokens - cleaned_tokens,
+             "saved_ratio": round(1 - cleaned_tokens / original_tokens, 3) if original_tokens else 0.0}
+    return cleaned_text, stats
@@ -0,0 +1,68 @@
+# backend/services/token_manager.py (Proactive, single-flight OAuth token refresh)
+import os
+from datetime import datetime, timedelta
+from fastapi import Depends
+from google_auth_httplib2 import Request as GoogleAuthRequest
+from auth import get_current_user, invalidate_user
+from database import AsyncSessionLocal
+from models import User
+from services import google_io, google_clients
+from services.singleflight import SingleFlight
+from services.ttl_cache import TTLCache
+
+TOKEN_REFRESH_SKEW = timedelta(seconds=int(os.getenv("TOKEN_REFRESH_SKEW_SECONDS", "300")))
+
+_refreshes = SingleFlight()
+# After a failed refresh, requests for that user skip proactive refreshing for a while instead of retrying Google each time.
+_recent_failures = TTLCache(maxsize=4096, ttl=float(os.getenv("TOKEN_REFRESH_FAILURE_BACKOFF_SECONDS", "45")))
+_stats = {"refreshes": 0, "failures": 0, "skipped_backoff": 0}
+
+def needs_refresh(user: User) -> bool:
+    if not user.oauth_refresh_token: return False
+    return user.oauth_token_expiry is None or user.oauth_token_expiry - TOKEN_REFRESH_SKEW <= datetime.utcnow()
+
+async def _refresh(user: User) -> User:
+    try:
+        return await _refresh_and_store(user)
+    except Exception:
+        # Counted here, once per attempt, rather than once per coalesced waiter.
+        _stats["failures"] += 1
+        _recent_failures.set(user.id, True)
+        raise
+
+async def _refresh_and_store(user: User) -> User:
+    creds = google_clients.build_credentials(user)
+    await google_io.run_blocking(creds.refresh, GoogleAuthRequest(google_io.pooled_http), stage="oauth_refresh")
+    async with AsyncSessionLocal() as session:
+        db_user = await session.get(User, user.id)
+        if db_user is None: raise ValueError(f"User {user.id} disappeared during token refresh.")
+        db_user.oauth_access_token = creds.token
+        db_user.oauth_token_expiry = creds.expiry  # google-auth keeps expiry as naive UTC, like this column
+        if creds.refresh_token: db_user.oauth_refresh_token = creds.refresh_token
+        session.add(db_user)
+        await session.commit()
+        await session.refresh(db_user)
+    invalidate_user(db_user.id)
+    google_clients.invalidate_user(db_user.id)
+    _stats["refreshes"] += 1
+    return db_user
+
+async def ensure_fresh(user: User) -> User:
+    """Refreshes the user's access token ahead of expiry; concurrent callers share one refresh."""
+    if user.id is None or not needs_refresh(user): return user
+    if _recent_failures.get(user.id):
+        _stats["skipped_backoff"] += 1
+        return user
+    try:
+        return await _refreshes.do(user.id, lambda: _refresh(user))
+    except Exception as e:
+        # google-auth can still refresh lazily on the first 401, so fall back instead of failing the request.
+        print(f"ERROR refreshing OAuth token for user {user.id}: {e}")
+        return user
+
+async def get_google_user(current_user: User = Depends(get_current_user)) -> User:
+    """Dependency for endpoints that call Google APIs: the authenticated user with a fresh access token."""
+    return await ensure_fresh(current_user)
+
+def stats() -> dict:
+    return {**_stats, "coalesced": _refreshes.shared, "in_flight": len(_refreshes)}
@@ -11,7 +11,7 @@ import ReactMarkdown from 'react-markdown';
 
 // --- Types ---
 interface User { displayName: string; email: string; avatarUrl: string; }
-interface Attachment { id: string; filename: string; mimeType: string; }
+interface Attachment { id: string; filename: string; mimeType: string; partId?: string; }
 interface EmailHeader { id: string; subject: string; sender: string; snippet: string; threadId: string; }
 interface EmailContent extends EmailHeader { body: string; attachments: Attachment[]; }
 interface AIAnalysis { summary: string; action_items: string[]; key_dates: string[]; error?: string; }